@@ -5,11 +5,11 @@ class IssueAssign:
         self.config = config
         print("IssueAssign initialization completed.")
 
-    def run(self,load_model,hetero):
+    def run(self,load_model,hetero,test_model=None,graph=None):
         try:
             model_class = ModelRegistry.get_model(self.config['model_name'])
             model = model_class(self.config)
-            model.run(load_model,hetero)
+            return model.run(load_model,hetero,test_model,graph)
         except Exception as e:
             print(f"Error during model execution: {e}")
             raise
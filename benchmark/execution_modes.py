@@ -0,0 +1,59 @@
+'''
+Epoch time and validation AUC of a model under each execution mode.
+
+The dataset is loaded once and every mode trains a fresh model on the same
+split. Example:
+
+    python benchmark/execution_modes.py --model hgraphsage --epochs 5
+'''
+import os
+import sys
+import argparse
+from time import time
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import ModelConf
+from model.registry import ModelRegistry
+from model.execution import EXECUTION_MODES
+from dataset.issueassigndataset import dataset_to_graph
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='hgraphsage', help='Registered model name')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--modes', type=str, default=','.join(EXECUTION_MODES))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    base_conf = ModelConf(os.path.join('config', args.model + '.conf'))
+    hetero = int(base_conf['graph_type']) == 1
+    graph = dataset_to_graph(base_conf['dataset_name'], hetero)
+
+    results = []
+    for mode in args.modes.split(','):
+        conf = ModelConf(os.path.join('config', args.model + '.conf'))
+        conf.config.update(execution_mode=mode, epoch=args.epochs, run_name=f'{args.model}_{mode}',
+                           checkpoint_dir=os.path.join(conf['output'], 'execution_modes', mode))
+        torch.manual_seed(args.seed)
+        model = ModelRegistry.get_model(args.model)(conf)
+        model.load_data(hetero, graph=graph)
+        if hasattr(model, 'pre_train'):
+            model.pre_train()
+
+        epoch_times = []
+        for epoch in range(args.epochs):
+            start = time()
+            model.train_epoch(epoch)
+            epoch_times.append(time() - start)
+        metrics = model.validate()
+        # The first epoch pays for compilation and lazy initialization
+        steady = epoch_times[1:] or epoch_times
+        results.append((mode, epoch_times[0], sum(steady) / len(steady), metrics['auc']))
+
+    print(f"{'mode':<14}{'first epoch s':>15}{'epoch s':>10}{'val AUC':>10}")
+    for mode, first, steady, auc in results:
+        print(f'{mode:<14}{first:>15.2f}{steady:>10.2f}{auc:>10.4f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Scaling efficiency of data-parallel HGraphSage training on a synthetic graph.
+
+Runs the same training for each process count and reports the epoch time,
+throughput and efficiency T1 / (N * TN). Example:
+
+    python benchmark/hgraphsage_ddp.py --num-users 200000 --num-issues 400000 --procs 1,2,4,8
+'''
+import os
+import sys
+import argparse
+from functools import partial
+import torch
+from torch_geometric.data import HeteroData
+from torch_geometric.transforms import ToUndirected
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model.distributed import train_ddp, EDGE_TYPE
+from model.hgraphsage import HeteroGraphSAGE
+
+def synthetic_graph(num_users, num_issues, num_participate, num_resolved, dim, seed):
+    generator = torch.Generator().manual_seed(seed)
+    data = HeteroData()
+    data['user'].x = torch.randn(num_users, dim, generator=generator)
+    data['issue'].x = torch.rand(num_issues, dim, generator=generator)
+    data['user', 'participate', 'issue'].edge_index = torch.stack([
+        torch.randint(num_users, (num_participate,), generator=generator),
+        torch.randint(num_issues, (num_participate,), generator=generator)])
+    data['user', 'participate', 'issue'].edge_weight = torch.ones(num_participate)
+    data['issue', 'resolved_by', 'user'].edge_index = torch.stack([
+        torch.randint(num_issues, (num_resolved,), generator=generator),
+        torch.randint(num_users, (num_resolved,), generator=generator)])
+    data = ToUndirected()(data)
+
+    # One random negative per positive, as RandomLinkSplit does for training
+    pos = data[EDGE_TYPE].edge_index
+    neg = torch.stack([torch.randint(num_issues, (num_resolved,), generator=generator),
+                       torch.randint(num_users, (num_resolved,), generator=generator)])
+    data[EDGE_TYPE].edge_label_index = torch.cat([pos, neg], dim=1)
+    data[EDGE_TYPE].edge_label = torch.cat([torch.ones(num_resolved), torch.zeros(num_resolved)])
+    return data
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-users', type=int, default=50000)
+    parser.add_argument('--num-issues', type=int, default=100000)
+    parser.add_argument('--num-participate', type=int, default=1000000)
+    parser.add_argument('--num-resolved', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--hidden-channels', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--procs', type=str, default='1,2,4,8')
+    parser.add_argument('--threads', type=int, default=None, help='Threads per process, defaults to cores // procs')
+    args = parser.parse_args()
+
+    data = synthetic_graph(args.num_users, args.num_issues, args.num_participate, args.num_resolved, args.dim, 0)
+    build_model = partial(HeteroGraphSAGE, args.dim, args.hidden_channels, args.dim, 0.1)
+    num_labels = data[EDGE_TYPE].edge_label.numel()
+
+    print(f'users={args.num_users}, issues={args.num_issues}, labelled edges={num_labels}, cores={os.cpu_count()}')
+    print(f"{'procs':>6}{'epoch s':>10}{'edges/s':>12}{'speedup':>10}{'efficiency':>12}")
+    baseline = None
+    for procs in [int(p) for p in args.procs.split(',')]:
+        _, epoch_times, _ = train_ddp(build_model, data, procs, args.epochs, args.batch_size, 0.01,
+                                      threads=args.threads)
+        # The first epoch includes loader and allocator warm-up
+        epoch_time = min(epoch_times[1:] or epoch_times)
+        baseline = baseline or epoch_time * procs
+        speedup = baseline / epoch_time
+        print(f'{procs:>6}{epoch_time:>10.2f}{num_labels / epoch_time:>12.0f}{speedup:>10.2f}{speedup / procs:>12.2%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+Error of the streaming AUC against sklearn's roc_auc_score.
+
+Draws positive and negative logits from pairs of normal distributions,
+including unnormalized and saturated ones whose sigmoids all round to 1,
+and fails when any error exceeds --tolerance. Example:
+
+    python benchmark/metric_auc.py --samples 5000 --batch-size 512
+'''
+import os
+import sys
+import argparse
+import torch
+from sklearn.metrics import roc_auc_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.metrics import BinaryMetricAccumulator
+
+# (positive mean, positive std, negative mean, negative std) of the logits
+CASES = [
+    (1, 1, 0, 1),
+    (0.05, 0.02, 0, 0.02),
+    (12, 3, 8, 3),
+    (10, 8, 0, 8),
+    (40, 10, 30, 10),
+    (90, 20, 80, 20),
+    (-30, 5, -35, 5),
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=5000, help='Samples per class')
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    worst = 0.0
+    print(f"{'positives':>14}{'negatives':>14}{'sklearn':>10}{'streaming':>11}{'error':>10}")
+    for pos_mean, pos_std, neg_mean, neg_std in CASES:
+        logits = torch.cat([pos_mean + pos_std * torch.randn(args.samples),
+                            neg_mean + neg_std * torch.randn(args.samples)])
+        labels = torch.cat([torch.ones(args.samples), torch.zeros(args.samples)]).long()
+        perm = torch.randperm(len(logits))
+        logits, labels = logits[perm], labels[perm]
+
+        metrics = BinaryMetricAccumulator()
+        for start in range(0, len(logits), args.batch_size):
+            metrics.update(logits[start:start + args.batch_size], labels[start:start + args.batch_size])
+        # Ranking the logits themselves, sigmoid ties would understate the reference
+        reference = roc_auc_score(labels.numpy(), logits.double().numpy())
+        error = abs(metrics.auc() - reference)
+        worst = max(worst, error)
+        print(f'{f"N({pos_mean},{pos_std})":>14}{f"N({neg_mean},{neg_std})":>14}'
+              f'{reference:>10.5f}{metrics.auc():>11.5f}{error:>10.2e}')
+
+    print(f'Worst error {worst:.2e}, tolerance {args.tolerance:.0e}')
+    if worst > args.tolerance:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
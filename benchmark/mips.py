@@ -0,0 +1,72 @@
+'''
+Recall-vs-latency report for the top-k developer retrieval index.
+
+Compares the exact blocked scan and the IVF mode over several nprobe values
+against a full matmul + topk ground truth. Example:
+
+    python benchmark/mips.py --num-users 1000000 --num-queries 512 --nprobe 4,8,16,32
+'''
+import os
+import sys
+import time
+import argparse
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.retrieval import MIPSIndex
+
+def recall_at_k(indices, truth):
+    hits = (indices.unsqueeze(2) == truth.unsqueeze(1)).any(dim=2).sum().item()
+    return hits / truth.numel()
+
+def timed_search(index, queries, k, repeat):
+    index.search(queries, k)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _, indices = index.search(queries, k)
+    return indices, 1000 * (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-users', type=int, default=200000)
+    parser.add_argument('--num-queries', type=int, default=256)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--topk', type=int, default=5)
+    parser.add_argument('--block-size', type=int, default=65536)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=str, default='1,4,8,16,32')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    # Clustered embeddings resemble trained ones more than isotropic noise does
+    centers = torch.randn(256, args.dim)
+    users = centers[torch.randint(256, (args.num_users,))] + 0.5 * torch.randn(args.num_users, args.dim)
+    queries = centers[torch.randint(256, (args.num_queries,))] + 0.5 * torch.randn(args.num_queries, args.dim)
+
+    start = time.perf_counter()
+    truth = torch.topk(torch.matmul(queries, users.T), k=args.topk, dim=1).indices
+    brute_ms = 1000 * (time.perf_counter() - start)
+
+    print(f'num_users={args.num_users}, num_queries={args.num_queries}, dim={args.dim}, k={args.topk}')
+    print(f"{'index':<24}{'build ms':>10}{'search ms':>12}{'recall@k':>10}")
+    print(f"{'full matmul':<24}{0:>10.1f}{brute_ms:>12.2f}{1:>10.4f}")
+
+    start = time.perf_counter()
+    exact = MIPSIndex(users, mode='exact', block_size=args.block_size)
+    build_ms = 1000 * (time.perf_counter() - start)
+    indices, search_ms = timed_search(exact, queries, args.topk, args.repeat)
+    print(f"{'exact':<24}{build_ms:>10.1f}{search_ms:>12.2f}{recall_at_k(indices, truth):>10.4f}")
+
+    start = time.perf_counter()
+    ivf = MIPSIndex(users, mode='ivf', block_size=args.block_size, nlist=args.nlist, seed=args.seed)
+    build_ms = 1000 * (time.perf_counter() - start)
+    for nprobe in [int(n) for n in args.nprobe.split(',')]:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        indices, search_ms = timed_search(ivf, queries, args.topk, args.repeat)
+        name = f'ivf nlist={ivf.nlist} nprobe={ivf.nprobe}'
+        print(f"{name:<24}{build_ms:>10.1f}{search_ms:>12.2f}{recall_at_k(indices, truth):>10.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Memory and throughput of dense (Adam) versus sparse (SparseAdam) Node2Vec training.
+
+Each mode runs in a fresh process on the same synthetic graph so that peak RSS
+is not shared between them. Example:
+
+    python benchmark/node2vec_sparse.py --num-nodes 1000000 --steps 50
+'''
+import argparse
+import resource
+import time
+import multiprocessing as mp
+import torch
+from torch_geometric.nn import Node2Vec
+
+def synthetic_edge_index(num_nodes, avg_degree, seed):
+    generator = torch.Generator().manual_seed(seed)
+    num_edges = num_nodes * avg_degree // 2
+    row = torch.randint(num_nodes, (num_edges,), generator=generator)
+    col = torch.randint(num_nodes, (num_edges,), generator=generator)
+    return torch.cat([torch.stack([row, col]), torch.stack([col, row])], dim=1)
+
+def optimizer_state_bytes(optimizer):
+    total = 0
+    for state in optimizer.state.values():
+        for value in state.values():
+            if torch.is_tensor(value):
+                total += value.numel() * value.element_size()
+    return total
+
+def run_mode(args, sparse, queue):
+    torch.manual_seed(args.seed)
+    edge_index = synthetic_edge_index(args.num_nodes, args.avg_degree, args.seed)
+    node2vec = Node2Vec(edge_index, embedding_dim=args.embedding_dim, walk_length=args.walk_length,
+                        context_size=args.context_size, walks_per_node=args.walks_per_node,
+                        num_negative_samples=1, num_nodes=args.num_nodes, sparse=sparse)
+    if sparse:
+        optimizer = torch.optim.SparseAdam(list(node2vec.parameters()), lr=args.lr)
+    else:
+        optimizer = torch.optim.Adam(list(node2vec.parameters()), lr=args.lr)
+    loader = node2vec.loader(batch_size=args.batch_size, shuffle=True)
+
+    # Sample the walks up front so only the optimizer step is timed
+    batches = []
+    for pos_rw, neg_rw in loader:
+        batches.append((pos_rw, neg_rw))
+        if len(batches) == args.steps + args.warmup:
+            break
+
+    node2vec.train()
+    step_times = []
+    for i, (pos_rw, neg_rw) in enumerate(batches):
+        start = time.perf_counter()
+        optimizer.zero_grad()
+        loss = node2vec.loss(pos_rw, neg_rw)
+        loss.backward()
+        optimizer.step()
+        if i >= args.warmup:
+            step_times.append(time.perf_counter() - start)
+
+    queue.put({
+        'mode': 'sparse' if sparse else 'dense',
+        'steps_per_sec': len(step_times) / sum(step_times),
+        'ms_per_step': 1000 * sum(step_times) / len(step_times),
+        'optimizer_state_mb': optimizer_state_bytes(optimizer) / 2 ** 20,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-nodes', type=int, default=200000)
+    parser.add_argument('--avg-degree', type=int, default=10)
+    parser.add_argument('--embedding-dim', type=int, default=64)
+    parser.add_argument('--walk-length', type=int, default=20)
+    parser.add_argument('--context-size', type=int, default=10)
+    parser.add_argument('--walks-per-node', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--lr', type=float, default=0.01)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    results = []
+    for sparse in (False, True):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_mode, args=(args, sparse, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    print(f'num_nodes={args.num_nodes}, embedding_dim={args.embedding_dim}, batch_size={args.batch_size}')
+    print(f"{'mode':<8}{'steps/s':>10}{'ms/step':>10}{'optim MB':>12}{'peak RSS MB':>14}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['steps_per_sec']:>10.2f}{r['ms_per_step']:>10.2f}"
+              f"{r['optimizer_state_mb']:>12.1f}{r['peak_rss_mb']:>14.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''
+Memory, latency and top-k overlap with float32 for each user table quantization.
+
+Runs on the tables written by an export (--export-dir) or on synthetic
+clustered embeddings, and names the smallest format whose overlap with the
+float32 top-k stays above --min-overlap. Example:
+
+    python benchmark/quantization.py --export-dir ./export/X-lab2017_open-digger/hgraphsage
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.retrieval import MIPSIndex
+from tools.quantize import QUANTIZATIONS, topk_overlap
+
+def load_tables(args):
+    if args.export_dir:
+        users = torch.from_numpy(np.load(os.path.join(args.export_dir, 'user_embeddings.npy')))
+        queries = torch.from_numpy(np.load(os.path.join(args.export_dir, 'issue_embeddings.npy')))
+        return users, queries[:args.num_queries]
+    torch.manual_seed(args.seed)
+    centers = torch.randn(256, args.dim)
+    users = centers[torch.randint(256, (args.num_users,))] + 0.5 * torch.randn(args.num_users, args.dim)
+    queries = centers[torch.randint(256, (args.num_queries,))] + 0.5 * torch.randn(args.num_queries, args.dim)
+    return users, queries
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export-dir', type=str, default=None, help='Use the exported embedding tables')
+    parser.add_argument('--num-users', type=int, default=200000)
+    parser.add_argument('--num-queries', type=int, default=1024)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--topk', type=int, default=5)
+    parser.add_argument('--block-size', type=int, default=65536)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-overlap', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    users, queries = load_tables(args)
+    print(f'num_users={users.size(0)}, num_queries={queries.size(0)}, dim={users.size(1)}, k={args.topk}')
+    print(f"{'quantization':<14}{'MiB':>10}{'search ms':>12}{'overlap@k':>11}")
+
+    reference = None
+    chosen = 'none'
+    for quantization in QUANTIZATIONS:
+        index = MIPSIndex(users, block_size=args.block_size, quantization=quantization)
+        index.search(queries, args.topk)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            _, indices = index.search(queries, args.topk)
+        search_ms = 1000 * (time.perf_counter() - start) / args.repeat
+        reference = indices if reference is None else reference
+        overlap = topk_overlap(indices, reference)
+        if overlap >= args.min_overlap:
+            chosen = quantization
+        print(f'{quantization:<14}{index.user_embs.nbytes / 2**20:>10.2f}{search_ms:>12.2f}{overlap:>11.4f}')
+    print(f'Smallest format with overlap@k >= {args.min_overlap}: {chosen}')
+
+if __name__ == '__main__':
+    main()
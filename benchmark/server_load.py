@@ -0,0 +1,76 @@
+'''
+Concurrent-request throughput and latency of the recommendation server.
+
+Start the server against a local mongod (cd server && uvicorn server:app)
+and run this once per server version to compare them. --seed inserts
+synthetic predictions to query first. Example:
+
+    python benchmark/server_load.py --seed 1000 --requests 5000 --concurrency 1,16,64
+'''
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone
+import aiohttp
+from pymongo import MongoClient
+
+def seed(uri, db_name, owner, name, num_issues):
+    collection = MongoClient(uri)[db_name]['issue_assign']
+    collection.delete_many({'owner': owner, 'name': name, 'model': 'load_test'})
+    collection.insert_many([{
+        'owner': owner, 'name': name, 'number': number, 'model': 'load_test',
+        'assignee': [f'user{i}' for i in range(5)], 'probability': [0.9, 0.8, 0.7, 0.6, 0.5],
+        'last_updated': datetime.now(timezone.utc)
+    } for number in range(1, num_issues + 1)])
+
+async def worker(session, url, payloads, latencies, errors):
+    while payloads:
+        payload = payloads.pop()
+        start = time.perf_counter()
+        try:
+            async with session.post(url, json=payload) as response:
+                await response.read()
+                if response.status >= 500:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+async def run(url, payloads, concurrency):
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session, url, payloads, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], len(errors)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--endpoint', default='/get_issue_resolvers')
+    parser.add_argument('--owner', default='X-lab2017')
+    parser.add_argument('--name', default='open-digger')
+    parser.add_argument('--num-issues', type=int, default=1000, help='Issue numbers are drawn from 1..num_issues')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=str, default='1,8,32,128')
+    parser.add_argument('--seed', type=int, default=0, help='Insert this many synthetic predictions first')
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--db', default='GFI-TEST1')
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.uri, args.db, args.owner, args.name, args.seed)
+        args.num_issues = args.seed
+
+    print(f"{'concurrency':>12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        payloads = [{'owner': args.owner, 'name': args.name, 'number': random.randint(1, args.num_issues)}
+                    for _ in range(args.requests)]
+        throughput, p50, p99, errors = asyncio.run(run(args.url + args.endpoint, payloads, concurrency))
+        print(f'{concurrency:>12}{throughput:>10.0f}{1000 * p50:>10.2f}{1000 * p99:>10.2f}{errors:>8}')
+
+if __name__ == '__main__':
+    main()
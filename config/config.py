@@ -11,6 +11,10 @@ class ModelConf():
         except KeyError:
             raise ValueError(f'Parameter {item} is not found in the configuration file!')
 
+    def get(self, item, default=None):
+        # Optional parameters fall back to the default instead of raising
+        return self.config.get(item, default)
+
     def read_configuration(self, file_path):
         if not os.path.exists(file_path):
             raise FileNotFoundError('Config file is not found!')
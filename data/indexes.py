@@ -0,0 +1,140 @@
+import os
+import logging
+import argparse
+from typing import Any, Dict, List, Tuple
+import yaml
+import pymongo
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, unique) for every lookup the collectors, the models and the server run
+INDEXES: List[Tuple[str, List[Tuple[str, int]], bool]] = [
+    ("repos", [("owner", 1), ("name", 1)], True),
+    ("repo_issues", [("owner", 1), ("name", 1), ("number", 1)], True),
+    ("repo_issues", [("owner", 1), ("name", 1), ("is_pull", 1), ("state", 1), ("number", 1)], False),
+    ("resolved_issues", [("owner", 1), ("name", 1), ("number", 1)], True),
+    ("open_issues", [("owner", 1), ("name", 1), ("number", 1)], True),
+    ("closed_prs", [("owner", 1), ("name", 1), ("number", 1)], True),
+    ("open_prs", [("owner", 1), ("name", 1), ("number", 1)], True),
+    ("issue_contents", [("owner", 1), ("name", 1), ("number", 1)], True),
+    ("fetch_logs", [("owner", 1), ("name", 1), ("update_end", 1)], False),
+    ("developer_metrics", [("owner", 1), ("name", 1), ("developer", 1)], True),
+    # Upsert key of the prediction writer, its (owner, name, number) prefix serves the resolver lookups
+    ("issue_assign", [("owner", 1), ("name", 1), ("number", 1), ("model", 1), ("run_version", 1)], True),
+    # Pruning and aborting a run
+    ("issue_assign", [("owner", 1), ("name", 1), ("model", 1), ("run_version", 1)], False),
+    ("issue_assign_versions", [("owner", 1), ("name", 1), ("model", 1)], True),
+    ("feedback", [("owner", 1), ("name", 1), ("number", 1), ("model", 1)], False),
+]
+
+# Representative filters of the hot queries, their plans must not scan a whole collection
+HOT_QUERIES: List[Tuple[str, Dict[str, Any]]] = [
+    ("repo_issues", {"owner": "owner", "name": "name", "number": 1}),
+    ("repo_issues", {"owner": "owner", "name": "name", "is_pull": False, "state": "closed", "number": {"$in": [1, 2]}}),
+    ("repo_issues", {"owner": "owner", "name": "name", "is_pull": True, "state": "closed"}),
+    ("resolved_issues", {"owner": "owner", "name": "name", "number": 1}),
+    ("open_issues", {"owner": "owner", "name": "name", "number": 1}),
+    ("closed_prs", {"owner": "owner", "name": "name", "number": 1}),
+    ("open_prs", {"owner": "owner", "name": "name", "number": 1}),
+    ("issue_contents", {"owner": "owner", "name": "name", "number": 1}),
+    ("developer_metrics", {"owner": "owner", "name": "name", "developer": {"$in": ["a", "b"]}}),
+    ("issue_assign", {"owner": "owner", "name": "name", "number": 1}),
+    ("issue_assign", {"owner": "owner", "name": "name", "number": {"$in": [1, 2]}}),
+    ("issue_assign", {"owner": "owner", "name": "name", "model": "model", "run_version": {"$ne": "0"}}),
+    ("issue_assign_versions", {"owner": "owner", "name": "name"}),
+]
+
+DUPLICATE_KEY = 11000
+
+
+def _index_name(keys: List[Tuple[str, int]], unique: bool) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys) + ("_unique" if unique else "")
+
+
+def ensure_indexes(db) -> None:
+    """
+    Create the declared indexes on a pymongo database. create_index is a
+    no-op for an index that already exists, so this is safe on every start.
+    """
+    for collection, keys, unique in INDEXES:
+        try:
+            db[collection].create_index(keys, unique=unique, name=_index_name(keys, unique))
+        except OperationFailure as e:
+            if not unique or e.code != DUPLICATE_KEY:
+                raise
+            # Existing duplicates prevent the unique index, the lookups still need one
+            logger.warning("Duplicate %s documents for %s, creating a non-unique index.", collection, keys)
+            db[collection].create_index(keys, name=_index_name(keys, False))
+
+
+async def ensure_indexes_async(db) -> None:
+    """
+    ensure_indexes for a motor database.
+    """
+    for collection, keys, unique in INDEXES:
+        try:
+            await db[collection].create_index(keys, unique=unique, name=_index_name(keys, unique))
+        except OperationFailure as e:
+            if not unique or e.code != DUPLICATE_KEY:
+                raise
+            logger.warning("Duplicate %s documents for %s, creating a non-unique index.", collection, keys)
+            await db[collection].create_index(keys, name=_index_name(keys, False))
+
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        return plan.get("stage") == "COLLSCAN" or any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+def check_query_plans(db) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Explain every hot query on a pymongo database and return those whose
+    winning plan contains a COLLSCAN.
+    """
+    flagged = []
+    for collection, query in HOT_QUERIES:
+        plan = db[collection].find(query).explain()
+        if _has_collscan(plan["queryPlanner"]["winningPlan"]):
+            logger.warning("COLLSCAN on %s for %s", collection, query)
+            flagged.append((collection, query))
+    return flagged
+
+
+async def check_query_plans_async(db) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    check_query_plans for a motor database.
+    """
+    flagged = []
+    for collection, query in HOT_QUERIES:
+        plan = await db[collection].find(query).explain()
+        if _has_collscan(plan["queryPlanner"]["winningPlan"]):
+            logger.warning("COLLSCAN on %s for %s", collection, query)
+            flagged.append((collection, query))
+    return flagged
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="Fail when a hot query still scans a collection")
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(__file__), "config.yaml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    db = pymongo.MongoClient(config["mongodb"]["url"])[config["mongodb"]["db"]]
+
+    ensure_indexes(db)
+    logger.info("Ensured %d indexes.", len(INDEXES))
+    if args.check:
+        flagged = check_query_plans(db)
+        logger.info("%d of %d hot queries scan a collection.", len(flagged), len(HOT_QUERIES))
+        if flagged:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import multiprocessing as mp
 from typing import List, Optional
 from datetime import datetime
 from dateutil.parser import parse as parse_date
+from indexes import ensure_indexes
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -161,5 +162,6 @@ if __name__ == "__main__":
     n_process = args.nprocess
 
     logger.info("Start dataset-building script!")
+    ensure_indexes(db)
     get_dataset_all(n_process)
     logger.info("Finish dataset-building script!")
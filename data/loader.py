@@ -81,48 +81,32 @@ def split_dataset(data, hetero=True):
 
     return train_data, val_data
 
+def link_loader(data, edge_label_index, edge_label, batch_size, hetero=True, shuffle=True, num_neighbors=[10, 10]):
+    # Mini-batches of labelled resolved_by edges with their sampled neighbourhoods
+    if hetero:
+        edge_label_index = (('issue', 'resolved_by', 'user'), edge_label_index)
+    return LinkNeighborLoader(
+        data=data,
+        num_neighbors=num_neighbors,
+        edge_label_index=edge_label_index,
+        edge_label=edge_label,
+        batch_size=batch_size,
+        shuffle=shuffle
+    )
+
 def dataset_to_batch(data, train_data, val_data, batch_size, hetero=True):
     num_neighbors = [10, 10]  # Number of neighbors sampled
     if hetero:
-        print("train_loader ---------------------------------")
-        train_loader = LinkNeighborLoader(
-            train_data,
-            num_neighbors=num_neighbors,
-            edge_label_index=(('issue', 'resolved_by', 'user'),
-                              train_data['issue', 'resolved_by', 'user'].edge_label_index),
-            edge_label=train_data['issue', 'resolved_by', 'user'].edge_label,
-            batch_size=batch_size,
-            shuffle=True
-        )
-        print("val_loader ---------------------------------")
-        val_loader = LinkNeighborLoader(
-            val_data,
-            num_neighbors=num_neighbors,
-            edge_label_index=(('issue', 'resolved_by', 'user'),
-                              val_data['issue', 'resolved_by', 'user'].edge_label_index),
-            edge_label=val_data['issue', 'resolved_by', 'user'].edge_label,
-            batch_size=batch_size,
-            shuffle=False
-        )
+        train_store = train_data['issue', 'resolved_by', 'user']
+        val_store = val_data['issue', 'resolved_by', 'user']
     else:
-        print("train_loader ---------------------------------")
-        train_loader = LinkNeighborLoader(
-            data=train_data,
-            num_neighbors=num_neighbors,
-            edge_label_index=train_data.edge_label_index,
-            edge_label=train_data.edge_label,
-            batch_size=batch_size,
-            shuffle=True
-        )
-        print("val_loader ---------------------------------")
-        val_loader = LinkNeighborLoader(
-            data=val_data,
-            num_neighbors=num_neighbors,
-            edge_label_index=val_data.edge_label_index,
-            edge_label=val_data.edge_label,
-            batch_size=batch_size,
-            shuffle=False
-        )
+        train_store, val_store = train_data, val_data
+    print("train_loader ---------------------------------")
+    train_loader = link_loader(train_data, train_store.edge_label_index, train_store.edge_label,
+                               batch_size, hetero, shuffle=True, num_neighbors=num_neighbors)
+    print("val_loader ---------------------------------")
+    val_loader = link_loader(val_data, val_store.edge_label_index, val_store.edge_label,
+                             batch_size, hetero, shuffle=False, num_neighbors=num_neighbors)
 
     # test_loader
     if hetero:
@@ -0,0 +1,48 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+FORMATS = ('npz', 'parquet')
+
+def save_predictions(path, numbers, users, scores, export_format='npz'):
+    '''
+    Write a run's top-k matrix: numbers [num_issues], users and scores [num_issues, k].
+    Parquet is stored long, one (number, rank, user, score) row per recommendation
+    '''
+    if export_format not in FORMATS:
+        raise ValueError(f"Prediction format '{export_format}' is not supported, use npz or parquet.")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    numbers = np.asarray(numbers, dtype=np.int64)
+    users = np.asarray(users).astype(str)
+    scores = np.asarray(scores, dtype=np.float32)
+    if export_format == 'npz':
+        np.savez_compressed(path, numbers=numbers, users=users, scores=scores)
+        return
+    k = scores.shape[1]
+    pd.DataFrame({
+        'number': np.repeat(numbers, k),
+        'rank': np.tile(np.arange(k, dtype=np.int16), len(numbers)),
+        'user': users.ravel(),
+        'score': scores.ravel()
+    }).to_parquet(path, index=False)
+
+def load_predictions(path):
+    '''
+    Read back (numbers, users, scores) from a prediction file, or from the
+    latest run in a directory of them
+    '''
+    if os.path.isdir(path):
+        runs = sorted(glob.glob(os.path.join(path, 'predictions_*.npz')) +
+                      glob.glob(os.path.join(path, 'predictions_*.parquet')))
+        if not runs:
+            raise FileNotFoundError(f'No prediction files in {path}.')
+        # Run versions are ObjectIds, which sort by creation time
+        path = runs[-1]
+    if path.endswith('.npz'):
+        with np.load(path) as f:
+            return f['numbers'], f['users'], f['scores']
+    df = pd.read_parquet(path).sort_values(['number', 'rank'], kind='stable')
+    k = int(df['rank'].max()) + 1
+    return (df['number'].to_numpy()[::k], df['user'].to_numpy().reshape(-1, k),
+            df['score'].to_numpy().reshape(-1, k))
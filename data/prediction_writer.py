@@ -0,0 +1,112 @@
+import queue
+import threading
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+
+class PredictionWriter:
+    '''
+    Writes one model run's recommendations to issue_assign. Upserts are
+    buffered and sent as unordered bulk_write batches from a background
+    thread, so the writes overlap inference. Every document is tagged with
+    the run_version of this run; commit() waits for the writes, points
+    issue_assign_versions at the new version in a single-document update,
+    which readers see atomically, and then prunes the older versions.
+    '''
+    def __init__(self, db, owner, name, model, batch_size=1000, max_pending=4):
+        self.collection = db['issue_assign']
+        self.versions = db['issue_assign_versions']
+        self.owner = owner
+        self.name = name
+        self.model = model
+        self.batch_size = int(batch_size)
+        # ObjectIds sort by creation time, so later runs get larger versions
+        self.run_version = str(ObjectId())
+        self.buffer = []
+        self.written = 0
+        self.error = None
+        # A bounded queue applies backpressure when inference outpaces MongoDB
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.worker = threading.Thread(target=self.write_batches, daemon=True)
+        self.worker.start()
+
+    def write(self, number, probability, assignees):
+        data = {
+            "owner": self.owner,
+            "name": self.name,
+            "number": number,
+            "model": self.model,
+            "probability": probability,
+            "last_updated": datetime.now(timezone.utc),
+            "assignee": assignees,
+            "run_version": self.run_version
+        }
+        self.buffer.append(UpdateOne(
+            {"owner": self.owner, "name": self.name, "number": number, "model": self.model,
+             "run_version": self.run_version},
+            {"$set": data},
+            upsert=True
+        ))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        if self.buffer:
+            self.pending.put(self.buffer)
+            self.buffer = []
+
+    def write_batches(self):
+        while True:
+            batch = self.pending.get()
+            if batch is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                result = self.collection.bulk_write(batch, ordered=False)
+                self.written += result.upserted_count + result.modified_count
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        '''
+        Send the remaining buffer and wait until every batch is written
+        '''
+        if self.worker.is_alive():
+            if self.buffer and self.error is None:
+                self.pending.put(self.buffer)
+            self.buffer = []
+            self.pending.put(None)
+            self.worker.join()
+        if self.error is not None:
+            raise self.error
+
+    def commit(self):
+        '''
+        Make this run's predictions the ones served and delete the older ones
+        '''
+        self.close()
+        self.versions.update_one(
+            {"owner": self.owner, "name": self.name, "model": self.model},
+            {"$set": {"run_version": self.run_version, "last_updated": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        pruned = self.collection.delete_many({
+            "owner": self.owner, "name": self.name, "model": self.model,
+            "run_version": {"$ne": self.run_version}
+        }).deleted_count
+        return self.written, pruned
+
+    def abort(self):
+        '''
+        Drop this run's partial predictions, the active version keeps being served
+        '''
+        try:
+            self.close()
+        finally:
+            self.collection.delete_many({
+                "owner": self.owner, "name": self.name, "model": self.model,
+                "run_version": self.run_version
+            })
@@ -13,6 +13,7 @@ from pymongo.errors import PyMongoError, BulkWriteError
 from github import Github, BadCredentialsException, RateLimitExceededException, UnknownObjectException
 from dateutil.parser import parse as parse_date
 from repofetcher import RepoFetcher
+from indexes import ensure_indexes
 
 from github_models import (
     Repo,
@@ -530,6 +531,8 @@ def main():
         sys.exit(1)
 
     logger.info("Valid tokens: %s", [t[:6]+"..." for t in valid_tokens])
+    # The per-issue lookups below rely on the (owner, name, number) indexes
+    ensure_indexes(db)
     logger.info("Start data update at %s", datetime.now())
 
     # Allocate tokens to repositories (here, every two tokens are allocated to several repositories as an example)
@@ -1,4 +1,5 @@
 import os
+import pickle
 import torch
 import pandas as pd
 from torch_geometric.data import InMemoryDataset, HeteroData,Data
@@ -81,6 +82,9 @@ class IssueAssignDataset(InMemoryDataset):
 
         # Save mappings for future use
         torch.save((user_mapping, issue_mapping), os.path.join(self.processed_dir, 'mappings.pt'))
+        # Save the fitted TF-IDF vocabularies so new issues are featurized like the training ones
+        with open(os.path.join(self.processed_dir, 'vectorizers.pkl'), 'wb') as f:
+            pickle.dump((title_vectorizer, body_vectorizer), f)
 
     def load_issue_nodes(self, issue_content_path, opened_issues_path, title_vectorizer, body_vectorizer):
         # Load issue node data
@@ -366,4 +370,26 @@ def dataset_to_graph(dataset_name, hetero):
     dataset = IssueAssignDataset(os.path.abspath(os.path.join('dataset', dataset_name)), hetero=hetero)
     data = dataset[0]
     user_mapping, issue_mapping = torch.load(os.path.join(dataset.processed_dir, 'mappings.pt'))
-    return data, user_mapping, issue_mapping
\ No newline at end of file
+    return data, user_mapping, issue_mapping
+
+class IssueFeaturizer():
+    '''
+    TF-IDF features of a new issue with the vocabularies fitted in process()
+    '''
+    def __init__(self, title_vectorizer, body_vectorizer):
+        self.title_vectorizer = title_vectorizer
+        self.body_vectorizer = body_vectorizer
+
+    def __call__(self, title, body):
+        title = self.title_vectorizer.transform([clean_text(title or '')]).toarray()
+        body = self.body_vectorizer.transform([clean_text(body or '')]).toarray()
+        return torch.cat([torch.tensor(title, dtype=torch.float), torch.tensor(body, dtype=torch.float)], dim=-1)
+
+def load_featurizer(dataset_name, hetero):
+    processed_dir = os.path.abspath(os.path.join('dataset', dataset_name, f"processed_{'hetero' if hetero else 'homo'}"))
+    path = os.path.join(processed_dir, 'vectorizers.pkl')
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{path} not found, the dataset was processed before the TF-IDF vocabularies '
+                                f'were persisted. Delete {processed_dir} to rebuild it.')
+    with open(path, 'rb') as f:
+        return IssueFeaturizer(*pickle.load(f))
@@ -415,7 +415,8 @@
       const requestData = {
         owner: owner,
         name: repo,
-        number: parseInt(issueNumber)
+        number: parseInt(issueNumber),
+        include_stats: true
       };
 
       // Send request to backend API
@@ -664,19 +665,23 @@
     });
 
     // 在这里获取开发者的统计数据，并展示为堆叠条形图
-    fetch('http://localhost:8000/get_developer_stats', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        owner: owner,
-        name: repo,
-        developers: recommendation.assignee
-      })
-    })
-    .then(res => {
-      if (!res.ok) throw new Error('Failed to fetch developer stats');
-      return res.json();
-    })
+    // Stats embedded by include_stats save a request, otherwise fetch them separately
+    const statsRequest = recommendation.stats
+      ? Promise.resolve(recommendation.stats)
+      : fetch('http://localhost:8000/get_developer_stats', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            owner: owner,
+            name: repo,
+            developers: recommendation.assignee
+          })
+        })
+        .then(res => {
+          if (!res.ok) throw new Error('Failed to fetch developer stats');
+          return res.json();
+        });
+    statsRequest
     .then(statsData => {
       // 创建一个显示区用于堆叠条形图
       const chartContainer = document.createElement('div');
@@ -825,7 +830,8 @@
       const requestData = {
         owner: owner,
         name: repo,
-        number: parseInt(issueNumber)
+        number: parseInt(issueNumber),
+        include_stats: true
       };
 
       fetch('http://localhost:8000/get_issue_resolvers', {
@@ -1071,19 +1077,23 @@
     });
 
     // 获取开发者的统计数据并展示为堆叠条形图（仅global_openrank、community_openrank、avg_activity）
-    fetch('http://localhost:8000/get_developer_stats', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        owner: owner,
-        name: repo,
-        developers: recommendation.assignee
-      })
-    })
-    .then(res => {
-      if (!res.ok) throw new Error('Failed to fetch developer stats');
-      return res.json();
-    })
+    // Stats embedded by include_stats save a request, otherwise fetch them separately
+    const statsRequest = recommendation.stats
+      ? Promise.resolve(recommendation.stats)
+      : fetch('http://localhost:8000/get_developer_stats', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            owner: owner,
+            name: repo,
+            developers: recommendation.assignee
+          })
+        })
+        .then(res => {
+          if (!res.ok) throw new Error('Failed to fetch developer stats');
+          return res.json();
+        });
+    statsRequest
     .then(statsData => {
       const metrics = [
         {key:'global_openrank', color:'#4CAF50', label:'Global OpenRank'},
@@ -1274,7 +1284,8 @@
       const requestData = {
         owner: owner,
         name: repo,
-        number: parseInt(issueNumber)
+        number: parseInt(issueNumber),
+        include_stats: true
       };
 
       fetch('http://localhost:8000/get_issue_resolvers', {
@@ -1520,19 +1531,23 @@
     });
 
     // 获取开发者的统计数据并展示为堆叠条形图（仅global_openrank、community_openrank、avg_activity）
-    fetch('http://localhost:8000/get_developer_stats', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        owner: owner,
-        name: repo,
-        developers: recommendation.assignee
-      })
-    })
-    .then(res => {
-      if (!res.ok) throw new Error('Failed to fetch developer stats');
-      return res.json();
-    })
+    // Stats embedded by include_stats save a request, otherwise fetch them separately
+    const statsRequest = recommendation.stats
+      ? Promise.resolve(recommendation.stats)
+      : fetch('http://localhost:8000/get_developer_stats', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            owner: owner,
+            name: repo,
+            developers: recommendation.assignee
+          })
+        })
+        .then(res => {
+          if (!res.ok) throw new Error('Failed to fetch developer stats');
+          return res.json();
+        });
+    statsRequest
     .then(statsData => {
       const metrics = [
         {key:'global_openrank', color:'#4CAF50', label:'Global OpenRank'},
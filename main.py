@@ -1,7 +1,11 @@
 import os
+import sys
+import argparse
+from time import time
 from IssueAssign import IssueAssign
 from model.registry import ModelRegistry
 from config.config import ModelConf
+from dataset.issueassigndataset import dataset_to_graph
 
 def get_model_name(available_models):
     model_name = input("Please enter the model you want to run: ")
@@ -26,8 +30,93 @@ def print_divider(title, width):
     print(f"{title.center(width)}")
     print("=" * width)
 
+def parse_args(available_models):
+    parser = argparse.ArgumentParser(description='Run without arguments for the interactive mode.')
+    parser.add_argument('--models', type=str, help=f"Comma-separated models to run: {','.join(available_models)}")
+    parser.add_argument('--repos', type=str, default=None,
+                        help='Comma-separated owner/name[=dataset_name], defaults to the repo in each .conf. '
+                             'The dataset may only be omitted for the repo of the .conf')
+    parser.add_argument('--load', action='store_true', help='Resume every model from its latest checkpoint')
+    parser.add_argument('--test', action='store_true', help='Test the models and save their recommendations')
+    parser.add_argument('--finetune', action='store_true',
+                        help='Fine-tune every model from its latest checkpoint on the new interactions')
+    return parser.parse_args()
+
+def parse_repos(repos):
+    # owner/name=dataset_name, the dataset falls back to the one in the .conf for the .conf repo only
+    parsed = []
+    for repo in repos.split(','):
+        repo, _, dataset_name = repo.strip().partition('=')
+        owner, name = repo.split('/')
+        parsed.append((owner, name, dataset_name or None))
+    return parsed
+
+def run_pipeline(args, available_models):
+    '''
+    Run every model for every repo without prompting, loading each
+    (dataset, graph type) once and sharing it between the models
+    '''
+    model_names = [m.strip() for m in args.models.split(',')]
+    unknown = [m for m in model_names if m not in available_models]
+    if unknown:
+        print(f"Unknown models: {', '.join(unknown)}. Available: {', '.join(available_models)}")
+        exit(-1)
+    repos = parse_repos(args.repos) if args.repos else [(None, None, None)]
+    # Without its own dataset another repo would train on the .conf dataset and be written under its name
+    for owner, name, dataset_name in repos:
+        for model_name in model_names:
+            config = load_configuration(model_name)
+            if owner and not dataset_name and (owner, name) != (config['owner'], config['name']):
+                print(f"{owner}/{name} is not the repo of {model_name}.conf, "
+                      f"give its dataset with --repos {owner}/{name}=<dataset_name>.")
+                exit(-1)
+
+    graphs = {}
+    summary = []
+    failed = False
+    for owner, name, dataset_name in repos:
+        for model_name in model_names:
+            config = load_configuration(model_name)
+            if owner:
+                config.config['owner'], config.config['name'] = owner, name
+            if dataset_name:
+                config.config['dataset_name'] = dataset_name
+            if args.finetune:
+                config.config['finetune'] = '1'
+            hetero = int(config['graph_type']) == 1  # 1 represents heterogeneous graph, 0 represents homogeneous graph
+            repo = f"{config['owner']}/{config['name']}"
+            print_divider(f'{model_name} on {repo}', 88)
+
+            key = (config['dataset_name'], hetero)
+            stage_times = {}
+            if key not in graphs:
+                start = time()
+                graphs[key] = dataset_to_graph(config['dataset_name'], hetero)
+                stage_times['load_graph'] = time() - start
+            try:
+                stage_times.update(IssueAssign(config).run(args.load, hetero, args.test, graphs[key]))
+            except Exception:
+                failed = True
+                stage_times['failed'] = 0.0
+            summary.append((repo, model_name, stage_times))
+
+    print_divider('Stage Timing Summary', 88)
+    stages = list(dict.fromkeys(stage for _, _, times in summary for stage in times))
+    print(f"{'repo':<30}{'model':<12}" + ''.join(f'{stage:>11}' for stage in stages))
+    for repo, model_name, times in summary:
+        cells = ''.join(f'{times[stage]:>10.2f}s' if stage in times else f"{'-':>11}" for stage in stages)
+        print(f'{repo:<30}{model_name:<12}' + cells)
+    return 1 if failed else 0
+
 if __name__ == '__main__':
     available_models = list(ModelRegistry.registry.keys())
+    if len(sys.argv) > 1:
+        args = parse_args(available_models)
+        if not args.models:
+            print('--models is required in the non-interactive mode.')
+            exit(-1)
+        exit(run_pipeline(args, available_models))
+
     title = "Issue-Assign Tool"
     print_divider(title,88)
     print("The existing model is as follows:")
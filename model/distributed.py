@@ -0,0 +1,102 @@
+import os
+import socket
+import tempfile
+from time import time
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch_geometric.loader import LinkNeighborLoader
+
+EDGE_TYPE = ('issue', 'resolved_by', 'user')
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def shard_edges(train_data, rank, world_size, seed):
+    '''
+    Equal-sized shard of the labelled edges for one rank, the remainder is
+    dropped so every rank runs the same number of steps per epoch
+    '''
+    edge_label_index = train_data[EDGE_TYPE].edge_label_index
+    edge_label = train_data[EDGE_TYPE].edge_label
+    perm = torch.randperm(edge_label.numel(), generator=torch.Generator().manual_seed(seed))
+    shard_size = edge_label.numel() // world_size
+    shard = perm[rank * shard_size:(rank + 1) * shard_size]
+    return edge_label_index[:, shard], edge_label[shard]
+
+def _edge_weight_dict(batch):
+    return {rel: batch[rel].edge_weight if 'edge_weight' in batch[rel] else None
+            for rel in batch.edge_index_dict.keys()}
+
+def _train_worker(rank, world_size, build_model, train_data, params, init_state, result_path):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(params['port'])
+    torch.set_num_threads(max(1, params['threads']))
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    try:
+        torch.manual_seed(params['seed'])
+        edge_label_index, edge_label = shard_edges(train_data, rank, world_size, params['seed'])
+        loader = LinkNeighborLoader(
+            train_data,
+            num_neighbors=[10, 10],
+            edge_label_index=(EDGE_TYPE, edge_label_index),
+            edge_label=edge_label,
+            batch_size=params['batch_size'],
+            shuffle=True
+        )
+        model = build_model()
+        # Lazy GraphConv weights must exist before DDP registers its gradient hooks
+        with torch.no_grad():
+            batch = next(iter(loader))
+            model(batch.x_dict, batch.edge_index_dict, _edge_weight_dict(batch))
+        if init_state is not None:
+            model.load_state_dict(init_state)
+        model = DistributedDataParallel(model)
+        optimizer = torch.optim.Adam(model.parameters(), lr=params['lr'])
+        criterion = torch.nn.BCEWithLogitsLoss()
+
+        epoch_times = []
+        losses = []
+        for _ in range(params['epochs']):
+            model.train()
+            start = time()
+            total_loss = torch.zeros(1)
+            for batch in loader:
+                optimizer.zero_grad()
+                out_dict = model(batch.x_dict, batch.edge_index_dict, _edge_weight_dict(batch))
+                src, dst = batch[EDGE_TYPE].edge_label_index
+                pred = (out_dict['issue'][src] * out_dict['user'][dst]).sum(dim=-1)
+                loss = criterion(pred, batch[EDGE_TYPE].edge_label.float())
+                loss.backward()  # DDP all-reduces the gradients here
+                optimizer.step()
+                total_loss += loss.detach()
+            dist.all_reduce(total_loss)
+            epoch_times.append(time() - start)
+            losses.append(total_loss.item() / world_size)
+
+        if rank == 0:
+            torch.save({'state_dict': model.module.state_dict(), 'epoch_times': epoch_times,
+                        'losses': losses}, result_path)
+    finally:
+        dist.destroy_process_group()
+
+def train_ddp(build_model, train_data, world_size, epochs, batch_size, lr, seed=0, threads=None, init_state=None):
+    '''
+    Data-parallel training of a HeteroGraphSAGE on world_size local CPU
+    processes over gloo. build_model must be a picklable callable returning
+    a fresh module, init_state optionally warm-starts it. Returns the trained
+    state_dict, the per-epoch wall times and the rank-averaged epoch losses
+    '''
+    threads = threads or max(1, (os.cpu_count() or 1) // world_size)
+    params = {'port': free_port(), 'threads': threads, 'seed': seed, 'epochs': epochs,
+              'batch_size': batch_size, 'lr': lr}
+    train_data.apply(lambda t: t.share_memory_())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_path = os.path.join(tmp_dir, 'result.pt')
+        mp.spawn(_train_worker, args=(world_size, build_model, train_data, params, init_state, result_path),
+                 nprocs=world_size, join=True)
+        result = torch.load(result_path)
+    return result['state_dict'], result['epoch_times'], result['losses']
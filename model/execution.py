@@ -0,0 +1,73 @@
+from contextlib import nullcontext
+import torch
+
+EXECUTION_MODES = ('eager', 'bf16', 'compile', 'bf16_compile')
+
+def check_execution_mode(mode):
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Execution mode '{mode}' is not supported, use one of {', '.join(EXECUTION_MODES)}.")
+    return mode
+
+def autocast_context(mode):
+    '''
+    bfloat16 autocast on CPU for the bf16 modes, a no-op otherwise
+    '''
+    if mode in ('bf16', 'bf16_compile'):
+        return torch.autocast(device_type='cpu', dtype=torch.bfloat16)
+    return nullcontext()
+
+class CompiledModule():
+    '''
+    Calls a torch.compile'd module and permanently falls back to the eager
+    module the first time compilation or a compiled call fails, e.g. on a
+    PyG or easygraph op that dynamo cannot trace. The wrapped module is
+    unchanged, so state_dict and checkpoints work the same in every mode.
+    '''
+    def __init__(self, module, log):
+        self.module = module
+        self.log = log
+        self.compiled = None
+        if hasattr(torch, 'compile'):
+            self.compiled = torch.compile(module, dynamic=True)
+        else:
+            self.log.info('torch.compile is not available in this torch version, running eager.')
+
+    def __call__(self, *args, **kwargs):
+        if self.compiled is not None:
+            try:
+                return self.compiled(*args, **kwargs)
+            except Exception as e:
+                self.log.info(f'torch.compile failed ({type(e).__name__}: {e}), falling back to eager.')
+                self.compiled = None
+        return self.module(*args, **kwargs)
+
+class AutocastFallback():
+    '''
+    Calls a module under the caller's bf16 autocast and permanently falls
+    back to float32 eager the first time the call fails, e.g. on an
+    easygraph sparse op without a CPU bfloat16 kernel. Later calls run with
+    autocast disabled even inside the caller's autocast region.
+    '''
+    def __init__(self, module, log):
+        self.module = module
+        self.log = log
+        self.bf16 = True
+
+    def __call__(self, *args, **kwargs):
+        if self.bf16:
+            try:
+                return self.module(*args, **kwargs)
+            except Exception as e:
+                self.log.info(f'bf16 autocast failed ({type(e).__name__}: {e}), falling back to float32 eager.')
+                self.bf16 = False
+                if isinstance(self.module, CompiledModule):
+                    self.module = self.module.module
+        with torch.autocast(device_type='cpu', enabled=False):
+            return self.module(*args, **kwargs)
+
+def compile_module(module, mode, log):
+    if mode in ('compile', 'bf16_compile'):
+        module = CompiledModule(module, log)
+    if mode in ('bf16', 'bf16_compile'):
+        module = AutocastFallback(module, log)
+    return module
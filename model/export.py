@@ -0,0 +1,140 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+import torch
+import torch.nn as nn
+
+class TopKScorer(nn.Module):
+    '''
+    Frozen scoring path: inner product of issue embeddings with the
+    precomputed user embeddings, top-k and sigmoid of the winners
+    '''
+    def __init__(self, user_embs, k):
+        super(TopKScorer, self).__init__()
+        self.register_buffer('user_embs', user_embs.detach().float().cpu().contiguous())
+        self.k = min(int(k), user_embs.size(0))
+
+    def forward(self, issue_embs):
+        scores = torch.matmul(issue_embs, self.user_embs.T)
+        top_k_scores, top_k_indices = torch.topk(scores, k=self.k, dim=1)
+        return torch.sigmoid(top_k_scores), top_k_indices
+
+def plain_linear(linear, bias=None):
+    '''
+    Copy a (possibly PyG) linear layer into a torch.nn.Linear that TorchScript and ONNX accept
+    '''
+    weight = linear.weight.detach().cpu()
+    out = nn.Linear(weight.size(1), weight.size(0), bias=bias is not None or linear.bias is not None)
+    with torch.no_grad():
+        out.weight.copy_(weight)
+        if bias is not None:
+            out.bias.copy_(bias.detach().cpu())
+        elif linear.bias is not None:
+            out.bias.copy_(linear.bias.detach().cpu())
+    return out
+
+def split_node_embeddings(node_embs, user_mapping, issue_mapping):
+    '''
+    User and issue rows of a homogeneous node embedding table with their ids, in index order
+    '''
+    node_embs = node_embs.detach().cpu()
+    user_ids = sorted(user_mapping, key=user_mapping.get)
+    issue_numbers = sorted(issue_mapping, key=issue_mapping.get)
+    user_embs = node_embs[torch.tensor([user_mapping[u] for u in user_ids], dtype=torch.long)]
+    issue_embs = node_embs[torch.tensor([issue_mapping[n] for n in issue_numbers], dtype=torch.long)]
+    return user_embs, user_ids, issue_embs, issue_numbers
+
+def vectorizer_table(vectorizer):
+    '''
+    What a fitted TfidfVectorizer needs at transform time, as plain JSON
+    '''
+    if vectorizer.ngram_range != (1, 1) or vectorizer.analyzer != 'word' or vectorizer.stop_words is not None:
+        raise ValueError('Only unigram word TF-IDF vectorizers without stop words can be exported.')
+    vocabulary = {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+    return {
+        'vocabulary': vocabulary,
+        'idf': vectorizer.idf_.astype(float).tolist(),
+        'token_pattern': vectorizer.token_pattern,
+        'lowercase': vectorizer.lowercase,
+        'sublinear_tf': vectorizer.sublinear_tf,
+        'norm': vectorizer.norm
+    }
+
+def export_scorer(export_dir, export_format, topk, user_embs, user_ids, issue_embs, issue_numbers,
+                  issue_tower=None, featurizer=None, meta=None):
+    '''
+    Write the artifacts the serving runtime needs:
+      scorer.pt/.onnx           issue embedding -> (probability, user row) top-k
+      issue_tower.pt/.onnx      issue features -> issue embedding, when the model has one
+      featurizer.json           title/body TF-IDF vocabularies and idf of the issue tower's features
+      user_embeddings.npy, user_ids.json, issue_embeddings.npy, issue_numbers.json, meta.json
+    '''
+    if export_format not in ('torchscript', 'onnx'):
+        raise ValueError(f"Export format '{export_format}' is not supported, use torchscript or onnx.")
+    os.makedirs(export_dir, exist_ok=True)
+    user_embs = user_embs.detach().float().cpu()
+    issue_embs = issue_embs.detach().float().cpu()
+    scorer = TopKScorer(user_embs, topk).eval()
+
+    save_module(scorer, issue_embs[:1], os.path.join(export_dir, 'scorer'), export_format,
+                ['issue_embedding'], ['probability', 'user_index'])
+    if issue_tower is not None:
+        issue_tower = issue_tower.cpu().eval()
+        save_module(issue_tower, torch.zeros(1, issue_tower.in_features), os.path.join(export_dir, 'issue_tower'),
+                    export_format, ['issue_features'], ['issue_embedding'])
+
+    with replaced(os.path.join(export_dir, 'user_embeddings.npy')) as path:
+        np.save(path, user_embs.numpy())
+    with replaced(os.path.join(export_dir, 'issue_embeddings.npy')) as path:
+        np.save(path, issue_embs.numpy())
+    with replaced(os.path.join(export_dir, 'user_ids.json')) as path, open(path, 'w') as f:
+        json.dump([str(u) for u in user_ids], f)
+    with replaced(os.path.join(export_dir, 'issue_numbers.json')) as path, open(path, 'w') as f:
+        json.dump([int(n) for n in issue_numbers], f)
+    if featurizer is not None:
+        with replaced(os.path.join(export_dir, 'featurizer.json')) as path, open(path, 'w') as f:
+            json.dump({'title': vectorizer_table(featurizer.title_vectorizer),
+                       'body': vectorizer_table(featurizer.body_vectorizer)}, f)
+    with replaced(os.path.join(export_dir, 'meta.json')) as path, open(path, 'w') as f:
+        json.dump({
+            'format': export_format,
+            'topk': scorer.k,
+            'embedding_dim': user_embs.size(1),
+            'issue_tower': issue_tower is not None,
+            'issue_feature_dim': issue_tower.in_features if issue_tower is not None else None,
+            'featurizer': featurizer is not None,
+            'exported_at': datetime.now(timezone.utc).isoformat(),
+            **(meta or {})
+        }, f, indent=2)
+
+@contextmanager
+def replaced(path):
+    '''
+    Yield a temporary path next to path and rename it over path once written.
+    The server memory-maps these files, truncating them in place would
+    break the live mappings, while a rename leaves the old inode to its readers
+    '''
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.',
+                                    suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def save_module(module, example, path, export_format, input_names, output_names):
+    with torch.no_grad(), replaced(path + ('.pt' if export_format == 'torchscript' else '.onnx')) as tmp_path:
+        if export_format == 'torchscript':
+            torch.jit.trace(module, example).save(tmp_path)
+        else:
+            torch.onnx.export(
+                module, (example,), tmp_path,
+                input_names=input_names, output_names=output_names,
+                dynamic_axes={name: {0: 'batch'} for name in input_names + output_names},
+                opset_version=17
+            )
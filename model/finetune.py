@@ -0,0 +1,49 @@
+import torch
+
+def edge_keys(edge_index, user_mapping, issue_mapping):
+    '''
+    (issue number, user) of every [issue, user] column, stable across dataset rebuilds
+    '''
+    issue_inv = {idx: number for number, idx in issue_mapping.items()}
+    user_inv = {idx: user for user, idx in user_mapping.items()}
+    keys = []
+    for issue_idx, user_idx in edge_index.t().tolist():
+        number, user = issue_inv.get(issue_idx), user_inv.get(user_idx)
+        keys.append((int(number) if number is not None else None, user))
+    return keys
+
+def remap_rows(old_table, old_mapping, new_table, new_mapping):
+    '''
+    Copy the rows of ids present in both mappings from old_table into
+    new_table in place, returns the new_table rows of the ids that are new
+    '''
+    src, dst, new_rows = [], [], []
+    for key, row in new_mapping.items():
+        old_row = old_mapping.get(key)
+        if old_row is None:
+            new_rows.append(row)
+        else:
+            src.append(old_row)
+            dst.append(row)
+    if dst:
+        new_table[torch.tensor(dst)] = old_table[torch.tensor(src)].to(new_table.dtype)
+    return new_rows
+
+def finetune_edges(edge_label_index, edge_label, previous_keys, user_mapping, issue_mapping, replay_ratio,
+                   generator=None):
+    '''
+    Labelled edges to fine-tune on: every positive that is not in previous_keys,
+    replay_ratio old positives per new one, and as many negatives as positives
+    '''
+    pos = (edge_label == 1).nonzero().squeeze(1)
+    neg = (edge_label == 0).nonzero().squeeze(1)
+    previous = set(map(tuple, previous_keys))
+    keys = edge_keys(edge_label_index[:, pos], user_mapping, issue_mapping)
+    is_new = torch.tensor([key not in previous for key in keys], dtype=torch.bool)
+    new_pos, old_pos = pos[is_new], pos[~is_new]
+    num_replay = min(old_pos.numel(), int(round(replay_ratio * new_pos.numel())))
+    replay = old_pos[torch.randperm(old_pos.numel(), generator=generator)[:num_replay]]
+    positives = torch.cat([new_pos, replay])
+    negatives = neg[torch.randperm(neg.numel(), generator=generator)[:positives.numel()]]
+    selected = torch.cat([positives, negatives])
+    return edge_label_index[:, selected], edge_label[selected], new_pos.numel(), num_replay
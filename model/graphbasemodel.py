@@ -1,9 +1,22 @@
+import os
+import copy
+import json
+import torch
+import numpy as np
+from contextlib import contextmanager
+from torch.profiler import profile, record_function, schedule, ProfilerActivity
 from tools.log import Log
+from tools.retrieval import MIPSIndex
+from .execution import check_execution_mode, autocast_context, compile_module as compile_for_mode
+from .export import export_scorer
+from .inductive import text_neighbor_embedding
+from .finetune import edge_keys, finetune_edges
 from time import strftime, localtime, time
 from data.mongo import MyMongoLoader
-from dataset.issueassigndataset import dataset_to_graph
-from data.loader import split_dataset,dataset_to_batch
-from datetime import datetime, timezone
+from data.prediction_writer import PredictionWriter
+from data.prediction_store import save_predictions
+from dataset.issueassigndataset import dataset_to_graph, load_featurizer
+from data.loader import split_dataset,dataset_to_batch,link_loader
 
 class GraphBaseModel:
   def __init__(self,config) -> None:
@@ -18,40 +31,363 @@ class GraphBaseModel:
     self.output = self.config['output']
     self.owner = self.config['owner']
     self.name = self.config['name']
+    self.seed = self.config.get('seed')
+    self.cache_dir = self.config.get('cache_dir', './cache/')
+    # Checkpointing and early stopping, patience=0 disables early stopping
+    self.checkpoint_dir = os.path.join(self.config.get('checkpoint_dir', './checkpoint/'),
+                                       f"{self.model_name}_{self.config['dataset_name']}")
+    self.checkpoint_interval = int(self.config.get('checkpoint_interval', 1))
+    self.patience = int(self.config.get('patience', 0))
+    self.monitor = self.config.get('monitor', 'val_auc')
+    if self.monitor not in ('val_auc', 'val_loss'):
+        raise ValueError(f"Monitor '{self.monitor}' is not supported, use val_auc or val_loss.")
+    self.start_epoch = 0
+    self.best_score = None
+    self.bad_epochs = 0
     current_time = strftime("%Y-%m-%d-%H-%M-%S", localtime(time()))
-    self.log = Log(self.model_name, self.model_name + '_' + current_time)
+    # run_name separates the log files of runs that start in the same second, e.g. sweep trials
+    self.run_name = self.config.get('run_name', self.model_name)
+    self.log = Log(self.run_name, self.run_name + '_' + current_time)
+    # Opt-in torch.profiler traces per run stage, written next to the log file
+    self.profile = bool(int(self.config.get('profile', 0)))
+    # Training is traced for this many batches after a skipped and a warmup batch
+    self.profile_steps = int(self.config.get('profile_steps', 20))
+    self.profiler = None
+    self.stage_times = {}
+    self.profile_summary = {}
+    # eager, bf16 (CPU autocast), compile (torch.compile) or bf16_compile
+    self.execution_mode = check_execution_mode(self.config.get('execution_mode', 'eager'))
+    # none, torchscript or onnx: freeze the scoring path for serving after the run
+    self.export_format = self.config.get('export', 'none')
+    self.export_dir = os.path.join(self.config.get('export_dir', './export/'),
+                                   f'{self.owner}_{self.name}', self.model_name)
+    # Warm-start fine-tuning from the latest checkpoint on new interactions
+    self.finetune = bool(int(self.config.get('finetune', 0)))
+    self.finetune_epochs = int(self.config.get('finetune_epochs', 3))
+    self.replay_ratio = float(self.config.get('replay_ratio', 1.0))
+    self.finetuning = False
+    self.finetune_nodes = None
+    # Train wall time and validation AUC of the last full training, fine-tuning is compared against them
+    self.baseline = None
+    self.train_seconds = None
+    self.val_auc = None
+    # none, npz or parquet: columnar copy of each test run's top-k under output
+    self.prediction_export = self.config.get('prediction_export', 'none')
+    self.predictions = []
         
   def train(self):
+    '''
+    Run the epochs left after start_epoch, saving a checkpoint every
+    checkpoint_interval epochs and stopping early once the monitored
+    validation metric has not improved for patience epochs
+    '''
+    for epoch in range(self.start_epoch, self.epoch):
+        self.train_epoch(epoch)
+        self.start_epoch = epoch + 1
+        stop = False
+        if self.patience > 0:
+            stop = self.early_stopping(self.validate())
+        if stop or (epoch + 1) % self.checkpoint_interval == 0 or epoch + 1 == self.epoch:
+            self.save_checkpoint()
+        if stop:
+            self.log.info(f'Early stopping at epoch {epoch + 1}, best {self.monitor}: {self.best_score:.4f}')
+            break
+    if self.patience > 0 and os.path.exists(os.path.join(self.checkpoint_dir, 'best.pt')):
+        self.log.info('Restoring the best checkpoint...')
+        self.load_checkpoint('best.pt', resume=False)
+
+  def train_epoch(self, epoch):
     pass
 
   def validate(self):
+    '''
+    Return a dict of validation metrics containing at least loss and auc
+    '''
     pass
 
   def test(self):
     pass
 
+  def early_stopping(self, metrics):
+    score = metrics['auc'] if self.monitor == 'val_auc' else -metrics['loss']
+    if self.best_score is None or score > self.best_score:
+        self.best_score = score
+        self.bad_epochs = 0
+        self.save_checkpoint('best.pt')
+        return False
+    self.bad_epochs += 1
+    return self.bad_epochs >= self.patience
+
+  def checkpoint_state(self):
+    '''
+    Everything needed to resume training, models holding other modules override this
+    '''
+    return {'model': self.model.state_dict(), 'optimizer': self.optimizer.state_dict()}
+
+  def restore_checkpoint_state(self, state):
+    self.model.load_state_dict(state['model'])
+    self.optimizer.load_state_dict(state['optimizer'])
+
+  def save_checkpoint(self, file_name='latest.pt'):
+    os.makedirs(self.checkpoint_dir, exist_ok=True)
+    path = os.path.join(self.checkpoint_dir, file_name)
+    # Write to a temporary file first so an interrupted save never corrupts the checkpoint
+    torch.save({
+        'epoch': self.start_epoch,
+        'state': self.checkpoint_state(),
+        'best_score': self.best_score,
+        'bad_epochs': self.bad_epochs,
+        'graph': self.graph_state(),
+        'baseline': self.baseline if self.finetuning else {'train_seconds': self.train_seconds, 'val_auc': self.val_auc}
+    }, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    self.log.debug(f'Checkpoint saved: {path} (epoch {self.start_epoch})')
+
+  def load_checkpoint(self, file_name='latest.pt', resume=True):
+    path = os.path.join(self.checkpoint_dir, file_name)
+    if not os.path.exists(path):
+        return False
+    checkpoint = torch.load(path, map_location='cpu')
+    self.restore_checkpoint_state(checkpoint['state'])
+    if not resume:
+        return True
+    self.start_epoch = checkpoint['epoch']
+    self.best_score = checkpoint['best_score']
+    self.bad_epochs = checkpoint['bad_epochs']
+    return True
+
+  def label_edges(self, data):
+    if self.hetero:
+        store = data['issue', 'resolved_by', 'user']
+        return store.edge_label_index, store.edge_label
+    return data.edge_label_index, data.edge_label
+
+  def graph_state(self):
+    '''
+    Node ids and labelled positive edges of the training graph,
+    fine-tuning diffs the rebuilt graph against them
+    '''
+    if self.graph_keys is None:
+        positives = []
+        for data in (self.train_data, self.val_data):
+            edge_label_index, edge_label = self.label_edges(data)
+            positives.append(edge_label_index[:, edge_label == 1])
+        self.graph_keys = edge_keys(torch.cat(positives, dim=1).cpu(), self.user_mapping, self.issue_mapping)
+    return {'user_mapping': self.user_mapping, 'issue_mapping': self.issue_mapping, 'positive_edges': self.graph_keys}
+
+  def grow_state(self, state, previous):
+    '''
+    Adapt a checkpoint state saved on the previous graph to the current one,
+    returns the state and the node rows that are new. Models with per-node
+    tables override this, GNN weights do not depend on the node count
+    '''
+    return state, []
+
+  def load_for_finetune(self):
+    '''
+    Warm start from the latest checkpoint: grow the node tables for nodes
+    added since it was saved, then train finetune_epochs epochs on the new
+    labelled edges plus a replay sample of old ones. Returns False when
+    there is nothing to start from, which leaves a full training in place
+    '''
+    path = os.path.join(self.checkpoint_dir, 'latest.pt')
+    checkpoint = torch.load(path, map_location='cpu') if os.path.exists(path) else None
+    if checkpoint is None or checkpoint.get('graph') is None:
+        self.log.info(f'No checkpoint to fine-tune in {self.checkpoint_dir}, training from scratch.')
+        return False
+    previous = checkpoint['graph']
+    state, new_rows = self.grow_state(checkpoint['state'], previous)
+    self.restore_checkpoint_state(state)
+    self.baseline = checkpoint.get('baseline')
+
+    generator = torch.Generator().manual_seed(int(self.seed) if self.seed is not None else 0)
+    edge_label_index, edge_label = self.label_edges(self.train_data)
+    edge_label_index, edge_label, num_new, num_replay = finetune_edges(
+        edge_label_index, edge_label, previous['positive_edges'], self.user_mapping, self.issue_mapping,
+        self.replay_ratio, generator
+    )
+    self.log.info(f'Fine-tuning on {num_new} new and {num_replay} replayed positive edges, {len(new_rows)} new nodes.')
+    self.train_loader = link_loader(self.train_data, edge_label_index, edge_label, self.batch_size, self.hetero)
+    if not self.hetero:
+        # Random walks of the embedding-table models start at the new nodes and the sampled edges
+        self.finetune_nodes = torch.unique(torch.cat([
+            torch.tensor(new_rows, dtype=torch.long), edge_label_index[:, edge_label == 1].flatten()]))
+    self.epoch = self.finetune_epochs if num_new > 0 or new_rows else 0
+    self.start_epoch = 0
+    self.finetuning = True
+    return True
+
+  def log_finetune_gain(self):
+    if not self.baseline or self.baseline.get('train_seconds') is None:
+        self.log.info(f'Fine-tuned in {self.train_seconds:.2f}s, no full training baseline to compare with.')
+        return
+    saved = self.baseline['train_seconds'] - self.train_seconds
+    self.log.info(f"Fine-tuned in {self.train_seconds:.2f}s vs {self.baseline['train_seconds']:.2f}s for a full "
+                  f"retrain, {saved:.2f}s ({saved / self.baseline['train_seconds']:.1%}) saved.")
+    if self.val_auc is not None and self.baseline.get('val_auc') is not None:
+        self.log.info(f"Validation AUC {self.val_auc:.4f} vs {self.baseline['val_auc']:.4f} for a full retrain.")
+
   def save_model(self):
-    pass
+    self.save_checkpoint()
 
   def load_model(self):
-    pass
+    if self.load_checkpoint():
+        self.log.info(f'Resuming from {self.checkpoint_dir} at epoch {self.start_epoch}.')
+    else:
+        self.log.info(f'No checkpoint found in {self.checkpoint_dir}, training from scratch.')
 
-  def save_issue_assign(self, owner, name, number, probability, assignees, issue_assign_collection):
-        data = {
-            "owner": owner,
-            "name": name,
-            "number": number,
-            "model":self.model_name,
-            "probability": probability,
-            "last_updated": datetime.now(timezone.utc),
-            "assignee": assignees
-        }
-        # Update or insert data
-        issue_assign_collection.update_one(
-            {"owner": owner, "name": name, "number": number,"model":self.model_name},
-            {"$set": data},
-            upsert=True
-        )
+  def scoring_tables(self):
+    '''
+    (user_embs, user_ids, issue_embs, issue_numbers) of the trained model, rows in index order
+    '''
+    raise NotImplementedError(f'{self.model_name} does not support export.')
+
+  def issue_tower(self):
+    '''
+    Module mapping raw issue features to issue embeddings for issues that are not
+    in the graph yet, None when issues can only be looked up by number
+    '''
+    return None
+
+  def export(self, export_format=None):
+    '''
+    Write the scoring artifacts to export_dir, they are served by
+    server/runtime.py without importing the training stack
+    '''
+    export_format = export_format or self.export_format
+    issue_tower = self.issue_tower()
+    featurizer = None
+    if issue_tower is not None:
+        # The runtime turns title and body into the tower's features with the exported vocabularies
+        try:
+            featurizer = self.featurizer or load_featurizer(self.config['dataset_name'], self.hetero)
+        except FileNotFoundError as e:
+            self.log.info(f'Exporting without a featurizer, new issues need precomputed features: {e}')
+    with torch.no_grad():
+        user_embs, user_ids, issue_embs, issue_numbers = self.scoring_tables()
+        export_scorer(self.export_dir, export_format, self.topk, user_embs, user_ids, issue_embs, issue_numbers,
+                      issue_tower=issue_tower, featurizer=featurizer,
+                      meta={'model': self.model_name, 'owner': self.owner, 'name': self.name,
+                            'dataset_name': self.config['dataset_name']})
+    self.log.info(f'Exported {export_format} scorer to {self.export_dir}')
+    return self.export_dir
+
+  def prepare_inductive(self):
+    '''
+    Load the TF-IDF vocabularies and embed the trained graph once, later
+    score_new_issue calls only embed the new issue and search the index
+    '''
+    self.featurizer = load_featurizer(self.config['dataset_name'], self.hetero)
+    with torch.no_grad():
+        user_embs, self.inductive_user_ids, issue_embs, _ = self.scoring_tables()
+    self.inductive_user_embs = user_embs.detach().float().cpu()
+    self.inductive_issue_embs = issue_embs.detach().float().cpu()
+    self.build_user_index(self.inductive_user_embs)
+
+  def embed_new_issue(self, features, opener):
+    '''
+    Embedding of an issue that is not in the graph. This default is the
+    text/neighbour fallback for embedding-table models on the homogeneous
+    graph, message passing models override it with an ego-network forward
+    '''
+    issue_rows = torch.tensor(sorted(self.issue_mapping.values()), dtype=torch.long)
+    opener_row = self.user_mapping.get(opener)
+    return text_neighbor_embedding(
+        features, self.data.x[issue_rows].cpu(), self.inductive_issue_embs,
+        self.inductive_user_embs[opener_row] if opener_row is not None else None,
+        num_neighbors=int(self.config.get('inductive_neighbors', 10))
+    )
+
+  def score_new_issue(self, title, body, opener, k=None):
+    '''
+    Top-k (user, probability) for a brand-new issue without retraining,
+    the model must be trained or loaded and its data loaded
+    '''
+    start = time()
+    if self.featurizer is None:
+        self.prepare_inductive()
+    features = self.featurizer(title, body)
+    with torch.no_grad():
+        issue_emb = self.embed_new_issue(features, opener)
+        top_k_scores, top_k_indices = self.user_index.search(issue_emb, int(k or self.topk))
+    recommendations = [(self.inductive_user_ids[i], p)
+                       for i, p in zip(top_k_indices[0].tolist(), torch.sigmoid(top_k_scores[0]).tolist())]
+    self.log.debug(f'Scored new issue by {opener} in {1000 * (time() - start):.1f} ms')
+    return recommendations
+
+  def autocast(self):
+    return autocast_context(self.execution_mode)
+
+  def compile_module(self, module):
+    '''
+    Callable running module in the configured execution mode, eager when
+    compilation fails and float32 when an op fails under bf16 autocast
+    '''
+    return compile_for_mode(module, self.execution_mode, self.log)
+
+  def build_user_index(self, user_embs):
+    self.user_index = MIPSIndex(
+        user_embs,
+        mode=self.config.get('retrieval', 'exact'),
+        block_size=int(self.config.get('retrieval_block_size', 65536)),
+        nlist=self.config.get('retrieval_nlist'),
+        nprobe=int(self.config.get('retrieval_nprobe', 8)),
+        quantization=self.config.get('retrieval_quantization', 'none')
+    )
+    if self.user_index.user_embs.quantization != 'none':
+        fp32_bytes = self.user_index.num_users * self.user_index.user_embs.size(1) * 4
+        self.log.info(f'User embeddings quantized to {self.user_index.user_embs.quantization}: '
+                      f'{self.user_index.user_embs.nbytes / 2**20:.1f} MiB instead of {fp32_bytes / 2**20:.1f} MiB')
+    return self.user_index
+
+  def search_users(self, issue_embs):
+    '''
+    Top-k users for each issue from the retrieval index,
+    the sigmoid is only applied to the winning scores
+    '''
+    with record_function('topk'):
+        top_k_scores, top_k_indices = self.user_index.search(issue_embs, int(self.topk))
+    return torch.sigmoid(top_k_scores), top_k_indices
+
+  def save_issue_assign(self, number, probability, assignees):
+    '''
+    Queue one issue's recommendations on the run's prediction writer
+    '''
+    with record_function('mongo_write'):
+        self.prediction_writer.write(number, probability, assignees)
+
+  def index_to_key(self, mapping):
+    '''
+    Object array holding each key of a mapping at its index, for vectorized reverse lookups
+    '''
+    keys = np.empty(max(mapping.values()) + 1, dtype=object)
+    keys[np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))] = np.array(list(mapping.keys()), dtype=object)
+    return keys
+
+  def record_predictions(self, issue_indices, user_indices, scores):
+    '''
+    Map a batch of top-k results from graph indices to issue numbers and
+    usernames with array lookups, keeping them for the columnar export
+    '''
+    if self.user_keys is None:
+        self.user_keys = self.index_to_key(self.user_mapping)
+        self.issue_keys = self.index_to_key(self.issue_mapping)
+    numbers = self.issue_keys[issue_indices]
+    users = self.user_keys[user_indices]
+    if self.prediction_export != 'none':
+        self.predictions.append((numbers, users, scores))
+    return numbers, users
+
+  def write_predictions(self, run_version):
+    if self.prediction_export == 'none' or not self.predictions:
+        return None
+    numbers, users, scores = (np.concatenate(parts) for parts in zip(*self.predictions))
+    path = os.path.join(self.output, f'{self.owner}_{self.name}', self.model_name,
+                        f'predictions_{run_version}.{self.prediction_export}')
+    save_predictions(path, numbers, users, scores, self.prediction_export)
+    self.predictions = []
+    self.log.info(f'Predictions for {len(numbers)} issues written to {path}')
+    return path
 
   def initializing_log(self):
       # Recorded in the log file, console displays
@@ -65,39 +401,155 @@ class GraphBaseModel:
         db = self.config['db']
         uri = self.config['uri']
         mongo_client = MyMongoLoader(uri,db)
-        self.issue_assign_collection = mongo_client.db['issue_assign']
+        self.prediction_writer = PredictionWriter(
+            mongo_client.db, self.owner, self.name, self.model_name,
+            batch_size=int(self.config.get('write_batch_size', 1000))
+        )
 
-  def load_data(self,hetero):
-      self.data,self.user_mapping,self.issue_mapping = dataset_to_graph(self.config['dataset_name'],hetero)
+  def load_data(self,hetero,graph=None):
+      if graph is None:
+          self.data,self.user_mapping,self.issue_mapping = dataset_to_graph(self.config['dataset_name'],hetero)
+      else:
+          # A preloaded graph is shared between runs, the shallow copy keeps split_dataset from mutating it
+          data,self.user_mapping,self.issue_mapping = graph
+          self.data = copy.copy(data)
+      self.hetero = hetero
+      self.featurizer = None
+      self.graph_keys = None
+      self.user_keys = None
+      self.issue_keys = None
       print("self.data",self.data) 
       self.num_users = self.data.num_nodes
       self.num_issues = self.data.num_nodes
       self.train_data,self.val_data = split_dataset(self.data,hetero)
       self.train_loader,self.val_loader,self.test_loader = dataset_to_batch(self.data,self.train_data,self.val_data,self.config['batch_size'],hetero)
 
-  def run(self, load_model=False,hetero=True,test_model=False):
+  @contextmanager
+  def stage(self, name, steps=False):
+    '''
+    Accumulate the wall-clock time spent in a run stage,
+    under torch.profiler as well when profiling is enabled.
+    A stage with steps only traces profile_steps of the batches
+    that profiled() yields instead of the whole stage
+    '''
+    start = time()
+    try:
+        if self.profile and steps:
+            with profile(activities=[ProfilerActivity.CPU],
+                         schedule=schedule(wait=1, warmup=1, active=self.profile_steps, repeat=1)) as prof:
+                self.profiler = prof
+                yield
+        elif self.profile:
+            with profile(activities=[ProfilerActivity.CPU]) as prof:
+                with record_function(name):
+                    yield
+        else:
+            yield
+    finally:
+        self.stage_times[name] = self.stage_times.get(name, 0.0) + time() - start
+        self.profiler = None
+    if self.profile and steps and prof.step_num == 0:
+        self.log.info(f'No batches of {name} were profiled.')
+    elif self.profile:
+        self.export_profile(name, prof)
+
+  def export_profile(self, name, prof):
+    trace_path = os.path.join(self.log.log_dir, f'{self.log.log_name}_{name}.trace.json')
+    prof.export_chrome_trace(trace_path)
+    events = sorted(prof.key_averages(), key=lambda e: e.self_cpu_time_total, reverse=True)
+    self.profile_summary[name] = {
+        'trace': trace_path,
+        'top_ops': [{
+            'name': e.key,
+            'count': e.count,
+            'cpu_time_total_ms': e.cpu_time_total / 1000,
+            'self_cpu_time_total_ms': e.self_cpu_time_total / 1000
+        } for e in events[:30]]
+    }
+    self.log.info(f'Profile of {name} written to {trace_path}')
+
+  def write_profile_summary(self):
+    summary_path = os.path.join(self.log.log_dir, f'{self.log.log_name}_profile.json')
+    with open(summary_path, 'w') as f:
+        json.dump({'stage_seconds': self.stage_times, 'stages': self.profile_summary}, f, indent=2)
+    self.log.info(f'Profile summary written to {summary_path}')
+
+  def profiled(self, loader, name='sample'):
+    '''
+    Iterate a loader with each batch fetch recorded as a profiler span,
+    advancing the schedule of a stage with steps after every batch
+    '''
+    iterator = iter(loader)
+    while True:
+        with record_function(name):
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+        yield batch
+        if self.profiler is not None:
+            self.profiler.step()
+
+  def run(self, load_model=False,hetero=True,test_model=None,graph=None):
+    '''
+    test_model=None asks on the console, graph reuses an already loaded dataset
+    '''
+    self.stage_times = {}
     self.log.info('Initializing Model...')
     self.initializing_log()
 
-    if load_model:
-            self.log.info('Loading Model...')
-            self.load_model()
-
     self.log.info(f"Loading {self.config['dataset_name']} Data...")
-    self.load_data(hetero)
+    with self.stage('load_data'):
+        self.load_data(hetero, graph)
+
+    if self.finetune:
+        self.log.info('Loading Model for Fine-Tuning...')
+        with self.stage('load_model'):
+            self.load_for_finetune()
+    elif load_model:
+        self.log.info('Loading Model...')
+        with self.stage('load_model'):
+            self.load_model()
 
-    self.log.info('Training Model...')
-    self.train()
+    self.log.info('Fine-Tuning Model...' if self.finetuning else 'Training Model...')
+    with self.stage('train', steps=True):
+        self.train()
+    self.train_seconds = self.stage_times['train']
 
     self.log.info('Validating Model...')
-    self.validate()
+    with self.stage('validate'):
+        metrics = self.validate()
+    self.val_auc = metrics['auc'] if metrics else None
+    if self.finetuning:
+        self.log_finetune_gain()
 
-    test_model = input('Do you want to test model?:')
-    if test_model.lower() == "test":
+    if test_model is None:
+        test_model = input('Do you want to test model?:').lower() == "test"
+    if test_model:
         self.log.info('Testing Model...')
         self.log.info('Connecting MongoDB...')
-        self.connect_mongo()
-        self.test()
+        with self.stage('test'):
+            self.connect_mongo()
+            self.predictions = []
+            try:
+                self.test()
+            except Exception:
+                self.prediction_writer.abort()
+                raise
+            written, pruned = self.prediction_writer.commit()
+            self.write_predictions(self.prediction_writer.run_version)
+        self.log.info(f'Activated prediction version {self.prediction_writer.run_version}: '
+                      f'{written} written, {pruned} stale removed')
 
     self.log.info('Saving Model...')
-    self.save_model()
\ No newline at end of file
+    with self.stage('save_model'):
+        self.save_model()
+
+    if self.export_format != 'none':
+        self.log.info('Exporting Model...')
+        with self.stage('export'):
+            self.export()
+    self.log.info('Stage times: ' + ', '.join(f'{k}={v:.2f}s' for k, v in self.stage_times.items()))
+    if self.profile:
+        self.write_profile_summary()
+    return self.stage_times
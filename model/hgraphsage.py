@@ -1,14 +1,20 @@
 from .registry import ModelRegistry
 from .graphbasemodel import GraphBaseModel
+from .distributed import train_ddp
+from .export import plain_linear
+from .finetune import remap_rows
+from functools import partial
 import os
+import math
 from torch_geometric.nn import SAGEConv,HeteroConv
 import torch.nn.functional as F
 import torch.nn as nn
 from torch_geometric.nn.conv import GraphConv
 import torch
+from torch.profiler import record_function
 from datetime import datetime, timezone
 import numpy as np
-from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from tools.metrics import BinaryMetricAccumulator
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
@@ -22,30 +28,81 @@ class HGraphSage(GraphBaseModel):
         self.out_channels = int(self.config["hyperparameter"]['out_channels'])
         self.dropout = int(self.config["hyperparameter"]['dropout'])
         self.model = HeteroGraphSAGE(self.in_channels,self.hidden_channels, self.out_channels,self.dropout).to(device)
+        self.forward_model = self.compile_module(self.model)
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=self.learningRate)
         self.criterion = nn.BCEWithLogitsLoss()
-    
+        # Number of local data-parallel processes, 1 trains in this process
+        self.num_procs = int(self.config.get('num_procs', 1))
+
     def train(self):
+        # Fine-tuning trains in this process on the sampled edges
+        if self.num_procs > 1 and not self.finetuning:
+            self.train_distributed()
+        else:
+            super().train()
+
+    def train_distributed(self):
+        '''
+        Train on num_procs local processes, each sampling its own shard of
+        edge_label_index with gradients all-reduced over gloo. Periodic
+        checkpoints and early stopping are not applied in this mode
+        '''
+        if self.start_epoch >= self.epoch:
+            return
+        self.log.info(f'Training with DistributedDataParallel on {self.num_procs} processes...')
+        build_model = partial(HeteroGraphSAGE, self.in_channels, self.hidden_channels, self.out_channels, self.dropout)
+        epochs = self.epoch - self.start_epoch
+        state_dict, epoch_times, losses = train_ddp(
+            build_model, self.train_data, self.num_procs, epochs, self.batch_size, self.learningRate,
+            seed=int(self.seed) if self.seed is not None else 0,
+            init_state=self.model.state_dict() if self.start_epoch > 0 else None
+        )
+        self.model.load_state_dict(state_dict)
+        for epoch, (epoch_time, loss) in enumerate(zip(epoch_times, losses), start=self.start_epoch + 1):
+            self.log.info(f'Epoch {epoch}/{self.epoch}, Loss: {loss:.4f}, Time: {epoch_time:.2f}s')
+        self.start_epoch = self.epoch
+    
+    def checkpoint_state(self):
+        # The user features are random per dataset build, keep them with the weights trained on them
+        state = super().checkpoint_state()
+        state['user_x'] = self.data['user'].x.detach().cpu()
+        return state
+
+    def restore_checkpoint_state(self, state):
+        super().restore_checkpoint_state(state)
+        if 'user_x' in state and state['user_x'].shape == self.data['user'].x.shape:
+            user_x = state['user_x'].to(self.data['user'].x.device)
+            for data in (self.data, self.train_data, self.val_data):
+                data['user'].x = user_x
+
+    def grow_state(self, state, previous):
+        user_x = self.data['user'].x.detach().cpu().clone()
+        new_rows = remap_rows(state['user_x'], previous['user_mapping'], user_x, self.user_mapping)
+        state['user_x'] = user_x
+        return state, new_rows
+
+    def train_epoch(self, epoch):
         self.model.train()
-        for epoch in range(self.epoch):
-            preds = []
-            labels = []
-            total_loss = 0
-            for batch in self.train_loader:
-                self.optimizer.zero_grad()
-                batch = batch.to(device)
-                x_dict = batch.x_dict
-                edge_index_dict = batch.edge_index_dict
-                
-                # Build edge_weight_dict
-                edge_weight_dict = {}
-                for rel in edge_index_dict.keys():
-                    if 'edge_weight' in batch[rel]:
-                        edge_weight_dict[rel] = batch[rel].edge_weight
-                    else:
-                        edge_weight_dict[rel] = None
-                
-                out_dict = self.model(x_dict, edge_index_dict,edge_weight_dict)
+        # Training accuracy and F1 have always cut the logits at 0.4, i.e. probabilities at sigmoid(0.4)
+        metrics = BinaryMetricAccumulator(threshold=1 / (1 + math.exp(-0.4)))
+        total_loss = 0
+        for batch in self.profiled(self.train_loader):
+            self.optimizer.zero_grad()
+            batch = batch.to(device)
+            x_dict = batch.x_dict
+            edge_index_dict = batch.edge_index_dict
+            
+            # Build edge_weight_dict
+            edge_weight_dict = {}
+            for rel in edge_index_dict.keys():
+                if 'edge_weight' in batch[rel]:
+                    edge_weight_dict[rel] = batch[rel].edge_weight
+                else:
+                    edge_weight_dict[rel] = None
+            
+            with record_function('forward'):
+                with self.autocast():
+                    out_dict = self.forward_model(x_dict, edge_index_dict,edge_weight_dict)
                 
                 issue_emb = out_dict['issue']
                 user_emb = out_dict['user']
@@ -54,29 +111,24 @@ class HGraphSage(GraphBaseModel):
                 
                 src_emb = issue_emb[src]
                 dst_emb = user_emb[dst]
-                
-                pred = (src_emb * dst_emb).sum(dim=-1)
+                # Scores and loss in float32, bf16 logits leave only a few hundred distinct probabilities
+                pred = (src_emb.float() * dst_emb.float()).sum(dim=-1)
                 loss = self.criterion(pred, batch['issue', 'resolved_by', 'user'].edge_label.float())
+            with record_function('backward'):
                 loss.backward()
+            with record_function('optimizer_step'):
                 self.optimizer.step()
-                total_loss += loss.item()
-                preds.append(pred.cpu())
-                labels.append(batch['issue', 'resolved_by', 'user'].edge_label.cpu()) 
+            total_loss += loss.item()
+            metrics.update(pred, batch['issue', 'resolved_by', 'user'].edge_label)
 
-            self.log.info(f'Epoch {epoch+1}/{self.epoch}, Loss: {total_loss:.4f}')       
-            preds = torch.cat(preds)
-            labels = torch.cat(labels)
-            pred_labels = (preds > 0.4).float()
-            accuracy = accuracy_score(labels, pred_labels)
-            f1 = f1_score(labels, pred_labels)
-            auc = roc_auc_score(labels.detach().numpy(), preds.detach().numpy())
-            self.log.info(f'Train Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
+        self.log.info(f'Epoch {epoch+1}/{self.epoch}, Loss: {total_loss:.4f}')       
+        accuracy, f1, auc = metrics.accuracy(), metrics.f1(), metrics.auc()
+        self.log.info(f'Train Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
 
     def validate(self):
         self.model.eval()
         total_loss = 0
-        preds = []
-        labels = []
+        metrics = BinaryMetricAccumulator(threshold=0.6)
         with torch.no_grad():
             for batch in self.val_loader:
                 batch = batch.to(device)
@@ -90,7 +142,8 @@ class HGraphSage(GraphBaseModel):
                     else:
                         edge_weight_dict[rel] = None
                 
-                out_dict = self.model(x_dict, edge_index_dict,edge_weight_dict)
+                with self.autocast():
+                    out_dict = self.forward_model(x_dict, edge_index_dict,edge_weight_dict)
                 
                 issue_emb = out_dict['issue']
                 user_emb = out_dict['user']
@@ -101,19 +154,14 @@ class HGraphSage(GraphBaseModel):
                 src_emb = issue_emb[src]
                 dst_emb = user_emb[dst]
                 
-                pred = (src_emb * dst_emb).sum(dim=-1)
+                pred = (src_emb.float() * dst_emb.float()).sum(dim=-1)
                 loss = self.criterion(pred, batch['issue', 'resolved_by', 'user'].edge_label.float())
                 total_loss += loss.item()               
-                preds.append(pred.cpu())
-                labels.append(batch['issue', 'resolved_by', 'user'].edge_label.cpu())
+                metrics.update(pred, batch['issue', 'resolved_by', 'user'].edge_label)
 
-        preds = torch.sigmoid(torch.cat(preds))
-        labels = torch.cat(labels)
-        pred_labels = ( preds > 0.6).float()
-        accuracy = accuracy_score(labels, pred_labels)
-        f1 = f1_score(labels, pred_labels)
-        auc = roc_auc_score(labels.detach().numpy(), preds.detach().numpy())
+        accuracy, f1, auc = metrics.accuracy(), metrics.f1(), metrics.auc()
         self.log.info(f'Validate Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
+        return {'loss': total_loss, 'accuracy': accuracy, 'f1': f1, 'auc': auc}
 
     # # For large-scale graphs, save user embeddings in batches
     # def get_allnode_emb(self):
@@ -173,14 +221,55 @@ class HGraphSage(GraphBaseModel):
                     edge_weight_dict[rel] = None
             out_dict = self.model(x_dict, edge_index_dict, edge_weight_dict)
             self.user_emb = out_dict['user']
+            self.issue_emb = out_dict['issue']
         print("All user embeddings have been computed and saved, shape:", self.user_emb.shape)
 
+    def scoring_tables(self):
+        self.get_allnode_emb()
+        user_ids = sorted(self.user_mapping, key=self.user_mapping.get)
+        issue_numbers = sorted(self.issue_mapping, key=self.issue_mapping.get)
+        return self.user_emb, user_ids, self.issue_emb, issue_numbers
+
+    def issue_tower(self):
+        return IssueTower(self.model)
+
+    def embed_new_issue(self, features, opener):
+        '''
+        Attach the new issue to its opener with a participate edge and run the
+        GNN on the ego network a 2-layer forward of the issue reads: the
+        opener and the issues it already participates in. An opener outside
+        the graph leaves the issue without neighbours, which IssueTower covers
+        '''
+        self.model.eval()
+        features = features.to(device)
+        if opener not in self.user_mapping:
+            return IssueTower(self.model).to(device)(features)
+        rel = ('user', 'participate', 'issue')
+        rev = ('issue', 'rev_participate', 'user')
+        opener_idx = self.user_mapping[opener]
+        mask = self.data[rel].edge_index[0] == opener_idx
+        neighbors = self.data[rel].edge_index[1, mask]
+        # Local indices: the opener is user 0, the new issue is issue 0 and its neighbours follow
+        x_dict = {
+            'user': self.data['user'].x[opener_idx].unsqueeze(0),
+            'issue': torch.cat([features, self.data['issue'].x[neighbors]], dim=0)
+        }
+        src = torch.zeros(neighbors.numel() + 1, dtype=torch.long, device=device)
+        dst = torch.arange(neighbors.numel() + 1, device=device)
+        # A new issue's participate edge is ISSUE_OPEN, weighted 1 like in the dataset
+        edge_weight = torch.cat([torch.ones(1, device=device), self.data[rel].edge_weight[mask]])
+        edge_index_dict = {rel: torch.stack([src, dst]), rev: torch.stack([dst, src])}
+        edge_weight_dict = {rel: edge_weight, rev: edge_weight}
+        out_dict = self.model(x_dict, edge_index_dict, edge_weight_dict)
+        return out_dict['issue'][:1]
+
     def test(self):
         '''
         Predicting the future is a completely new issue, 
         without ground truth or any interactive information
         '''
         self.get_allnode_emb()
+        self.build_user_index(self.user_emb)
         self.model.eval()
         with torch.no_grad():
             for subgraph in self.test_loader:
@@ -201,35 +290,19 @@ class HGraphSage(GraphBaseModel):
 
                 # Retrieve the issue index from the batch
                 # issue_batch = subgraph['issue'].batch  # [batch_size]
-                # For each issue, calculate the similarity with all users
-                scores = torch.matmul(self.user_emb, issue_emb.T).T  # [batch_size, num_users]
-                probabilities = torch.sigmoid(scores)
+                # Get the top-K users for each issue from the index
+                top_k_scores, top_k_indices = self.search_users(issue_emb)  # [batch_size, top_k]
 
-                # Get the top-K users for each issue
-                top_k_scores, top_k_indices = torch.topk(probabilities, k=self.topk, dim=1)  # [batch_size, top_k]
-
-                # Map user index to username
-                user_indices_np = top_k_indices.cpu().numpy()
-                # Create reverse user mapping
-                user_mapping_inv = {idx: user for user, idx in self.user_mapping.items()}
-                # Traverse each element (per user index) in user_indices_np and 
-                # use user_mapping_inv.get to query the username corresponding to each index
-                user_names_array = np.vectorize(user_mapping_inv.get)(user_indices_np)
-
-                # Obtain the corresponding issue number
-                issue_global_indices = subgraph['issue'].n_id.cpu().numpy()  # Global index
-                # Create reverse issue mapping
-                issue_mapping_inv = {idx: number for number, idx in self.issue_mapping.items()}
-                open_issue_numbers = [issue_mapping_inv[idx] for idx in issue_global_indices]
+                # Map user indices to usernames and issue indices to issue numbers
+                issue_numbers, user_names_array = self.record_predictions(
+                    subgraph['issue'].n_id.cpu().numpy(), top_k_indices.cpu().numpy(), top_k_scores.cpu().numpy()
+                )
 
                 # Save prediction results
-                for issue_number, user_names, scores in zip(open_issue_numbers, user_names_array, top_k_scores.cpu().numpy()):
+                for issue_number, user_names, scores in zip(issue_numbers, user_names_array, top_k_scores.cpu().numpy()):
                     probabilities_list = scores.tolist()
                     user_names_list = user_names.tolist()
-                    self.save_issue_assign(
-                        self.owner, self.name, issue_number,
-                        probabilities_list, user_names_list, self.issue_assign_collection
-                    )
+                    self.save_issue_assign(issue_number, probabilities_list, user_names_list)
 
 
 class HeteroGraphSAGE(nn.Module):
@@ -263,4 +336,25 @@ class HeteroGraphSAGE(nn.Module):
         x_dict = self.conv2(x_dict, edge_index_dict, edge_weight_dict=edge_weight_dict)
         return x_dict
 
-  
\ No newline at end of file
+  
+
+class IssueTower(nn.Module):
+    '''
+    HeteroGraphSAGE forward for an issue that has no neighbours yet. The
+    aggregated message of each GraphConv is zero, so only the root weight
+    and the bias of lin_rel remain, and eval-mode dropout is the identity
+    '''
+    def __init__(self, model):
+        super(IssueTower, self).__init__()
+        rel = ('user', 'participate', 'issue')
+        conv1 = model.conv1.convs[rel]
+        conv2 = model.conv2.convs[rel]
+        self.in_features = model.issue_mlp.in_features
+        self.issue_mlp = plain_linear(model.issue_mlp)
+        self.conv1 = plain_linear(conv1.lin_root, bias=conv1.lin_rel.bias)
+        self.conv2 = plain_linear(conv2.lin_root, bias=conv2.lin_rel.bias)
+
+    def forward(self, x):
+        x = self.issue_mlp(x)
+        x = torch.relu(self.conv1(x))
+        return self.conv2(x)
@@ -0,0 +1,19 @@
+import torch
+import torch.nn.functional as F
+
+def text_neighbor_embedding(features, issue_features, issue_embs, opener_emb=None, num_neighbors=10):
+    '''
+    Embedding for an issue the model has never seen: the similarity-weighted
+    mean of the num_neighbors issues with the closest TF-IDF features,
+    averaged with the opener's embedding when the opener is in the graph
+    '''
+    sims = torch.matmul(F.normalize(issue_features.float(), dim=1), F.normalize(features.float(), dim=1).T).squeeze(1)
+    top = torch.topk(sims, k=min(num_neighbors, sims.numel()))
+    weights = top.values.clamp(min=0)
+    if weights.sum() <= 0:
+        # No shared vocabulary, fall back to an unweighted mean
+        weights = torch.ones_like(weights)
+    emb = (issue_embs[top.indices] * weights.unsqueeze(1)).sum(dim=0, keepdim=True) / weights.sum()
+    if opener_emb is not None:
+        emb = (emb + opener_emb.view(1, -1)) / 2
+    return emb
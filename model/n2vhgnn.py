@@ -1,18 +1,20 @@
 from .registry import ModelRegistry
 from .graphbasemodel import GraphBaseModel
+from .n2vpretrain import Node2VecEmbeddingMixin
+from .export import split_node_embeddings
 import os
 import torch
-from torch_geometric.nn import Node2Vec
+from torch.profiler import record_function
 import torch.nn.functional as F
 import torch.nn as nn
 import numpy as np
-from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from tools.metrics import BinaryMetricAccumulator
 import easygraph as eg
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
 @ModelRegistry.register('n2vhgnn')
-class N2VHGNN(GraphBaseModel):
+class N2VHGNN(Node2VecEmbeddingMixin, GraphBaseModel):
     def __init__(self, config):
         super().__init__(config)
         self.config = config
@@ -21,7 +23,6 @@ class N2VHGNN(GraphBaseModel):
         self.context_size = int(self.config["hyperparameter"].get('context_size', 10))
         self.walks_per_node = int(self.config["hyperparameter"].get('walks_per_node', 10))
         self.num_negative_samples = int(self.config["hyperparameter"].get('num_negative_samples', 1))
-        # self.sparse = self.config["hyperparameter"].get('sparse', True)
         self.batch_size = int(self.config["batch_size"])
         self.learning_rate = float(self.config["learningRate"])
         self.epoch = int(self.config["epoch"])
@@ -31,108 +32,103 @@ class N2VHGNN(GraphBaseModel):
         self.out_channels = int(self.config["hyperparameter"].get('out_channels', 64))
         self.model = eg.HGNN(in_channels = self.in_channels , hid_channels = self.hidden_channels,
                      num_classes = self.out_channels).to(device)
+        self.forward_model = self.compile_module(self.model)
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=self.learning_rate)
         self.criterion = nn.BCEWithLogitsLoss()
         
 
     def pre_train(self):
-        self.node2vec = Node2Vec(
-            edge_index=self.data.edge_index,
-            embedding_dim=self.embedding_dim,
-            walk_length=self.walk_length,
-            context_size=self.context_size,
-            walks_per_node=self.walks_per_node,
-            num_negative_samples=self.num_negative_samples,
-            # sparse=self.sparse
-        ).to(device)
-        self.n2v_optimizer = torch.optim.Adam(self.node2vec.parameters(), lr=self.learning_rate)
         self.log.info('Pre-Training Node2Vec Embeddings...')
-        self.node2vec.train()
-        loader = self.node2vec.loader(batch_size=self.batch_size, shuffle=True)
-        for epoch in range(1, self.epoch + 1):
-            total_loss = 0
-            for pos_rw, neg_rw in loader:
-                self.n2v_optimizer.zero_grad()
-                loss = self.node2vec.loss(pos_rw.to(device), neg_rw.to(device))
-                loss.backward()
-                self.n2v_optimizer.step()
-                total_loss += loss.item()
-            # avg_loss = total_loss / len(loader)
-            # self.log.info(f'Epoch: {epoch:03d}, Loss: {avg_loss:.4f}')
+        if self.finetuning:
+            self.node2vec = self.pretrainer().fit(init_embedding=self.node_embeddings, start_nodes=self.finetune_nodes)
+        else:
+            self.node2vec = self.pretrainer().fit()
         self.log.info('Node2Vec Embeddings Pre-Training Complete.')
         self.node_embeddings = self.node2vec.embedding.weight.detach()
 
     def train(self):
-        self.pre_train()
+        # A resumed HGNN keeps the embedding table it was trained on, a fresh pretraining could differ from it
+        if self.start_epoch > 0 and not self.finetuning and getattr(self, 'node_embeddings', None) is not None:
+            self.log.info('Using the Node2Vec embeddings of the checkpoint.')
+        else:
+            self.pre_train()
+        super().train()
+
+    def checkpoint_state(self):
+        state = super().checkpoint_state()
+        state['embedding'] = self.node_embeddings.cpu()
+        return state
+
+    def restore_checkpoint_state(self, state):
+        super().restore_checkpoint_state(state)
+        if 'embedding' in state:
+            self.node_embeddings = state['embedding'].to(device)
+
+    def train_epoch(self, epoch):
         self.model.train()
-        for epoch in range(self.epoch):
-            total_loss = 0
-            preds = []
-            labels = []
-            for batch in self.train_loader:
-                batch = batch.to(device)
-                batch_node_indices = batch.n_id
-                batch_node_embeddings = self.node_embeddings[batch_node_indices].to(device)
+        total_loss = 0
+        metrics = BinaryMetricAccumulator(threshold=0.6)
+        for batch in self.profiled(self.train_loader):
+            batch = batch.to(device)
+            batch_node_indices = batch.n_id
+            batch_node_embeddings = self.node_embeddings[batch_node_indices].to(device)
+            with record_function('hypergraph_knn'):
                 batch_hg = eg.Hypergraph.from_feature_kNN(batch_node_embeddings, k=3).to(device)
-                outputs = self.model(batch_node_embeddings, batch_hg)
+            with record_function('forward'):
+                with self.autocast():
+                    outputs = self.forward_model(batch_node_embeddings, batch_hg)
                 src = batch.edge_label_index[0]
                 dst = batch.edge_label_index[1]
                 src_emb = outputs[src]
                 dst_emb = outputs[dst]
-                pred = (src_emb * dst_emb).sum(dim=-1)
+                # Scores and loss in float32, bf16 logits leave only a few hundred distinct probabilities
+                pred = (src_emb.float() * dst_emb.float()).sum(dim=-1)
                 loss = self.criterion(pred, batch.edge_label.float())
-                self.optimizer.zero_grad()
+            self.optimizer.zero_grad()
+            with record_function('backward'):
                 loss.backward()
+            with record_function('optimizer_step'):
                 self.optimizer.step()
-                total_loss += loss.item()
-                preds.append(pred.cpu())
-                labels.append(batch.edge_label.cpu())
-
-            self.log.info(f'Epoch {epoch+1}/{self.epoch}, Loss: {total_loss:.4f}')       
-            preds = torch.sigmoid(torch.cat(preds))
-            labels = torch.cat(labels)
-            pred_labels = (preds > 0.6).float()
-            accuracy = accuracy_score(labels, pred_labels)
-            f1 = f1_score(labels, pred_labels)
-            auc = roc_auc_score(labels.detach().numpy(), preds.detach().numpy())
-            self.log.info(f'Train Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
+            total_loss += loss.item()
+            metrics.update(pred, batch.edge_label)
+
+        self.log.info(f'Epoch {epoch+1}/{self.epoch}, Loss: {total_loss:.4f}')       
+        accuracy, f1, auc = metrics.accuracy(), metrics.f1(), metrics.auc()
+        self.log.info(f'Train Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
 
     def validate(self):
         self.log.info('Validating...')
         self.model.eval()
         total_loss = 0
-        preds = []
-        labels = []
+        metrics = BinaryMetricAccumulator(threshold=0.6)
         with torch.no_grad():
             for batch in self.val_loader:
                 batch = batch.to(device)
                 batch_node_indices = batch.n_id
                 batch_node_embeddings = self.node_embeddings[batch_node_indices].to(device)
                 batch_hg = eg.Hypergraph.from_feature_kNN(batch_node_embeddings, k=3).to(device)
-                outputs = self.model(batch_node_embeddings, batch_hg)
+                with self.autocast():
+                    outputs = self.forward_model(batch_node_embeddings, batch_hg)
 
                 src = batch.edge_label_index[0]
                 dst = batch.edge_label_index[1]
                 src_emb = outputs[src]
                 dst_emb = outputs[dst]
-                pred = (src_emb * dst_emb).sum(dim=-1)
+                pred = (src_emb.float() * dst_emb.float()).sum(dim=-1)
 
                 loss = self.criterion(pred, batch.edge_label.float())
                 total_loss += loss.item()
 
-                preds.append(pred.cpu())
-                labels.append(batch.edge_label.cpu())
+                metrics.update(pred, batch.edge_label)
 
-        preds = torch.sigmoid(torch.cat(preds))
-        labels = torch.cat(labels)
-        pred_labels = (preds > 0.6).float()
-        accuracy = accuracy_score(labels, pred_labels)
-        f1 = f1_score(labels, pred_labels)
-        auc = roc_auc_score(labels.detach().numpy(), preds.detach().numpy())
+        accuracy, f1, auc = metrics.accuracy(), metrics.f1(), metrics.auc()
         self.log.info(f'Validate Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
+        return {'loss': total_loss, 'accuracy': accuracy, 'f1': f1, 'auc': auc}
 
-    def test(self):
-        self.log.info('Testing...')
+    def all_node_outputs(self):
+        '''
+        HGNN embeddings of every node over a kNN hypergraph of the Node2Vec embeddings
+        '''
         self.model.eval()
         with torch.no_grad():
             # Get embeddings for all nodes
@@ -141,7 +137,16 @@ class N2VHGNN(GraphBaseModel):
             # Build a hypergraph including all nodes
             hg = eg.Hypergraph.from_feature_kNN(node_embeddings, k=3).to(device)
             # Get updated embeddings for all nodes
-            outputs = self.model(node_embeddings, hg)
+            return self.model(node_embeddings, hg)
+
+    def scoring_tables(self):
+        return split_node_embeddings(self.all_node_outputs(), self.user_mapping, self.issue_mapping)
+
+    def test(self):
+        self.log.info('Testing...')
+        self.model.eval()
+        with torch.no_grad():
+            outputs = self.all_node_outputs()
 
             # Get indices for user and issue nodes
             user_indices = torch.arange(self.data.num_nodes)[self.data.node_type == 0].to(device)
@@ -151,9 +156,7 @@ class N2VHGNN(GraphBaseModel):
             user_embs = outputs[user_indices]
             # issue_embs_all = outputs[issue_indices_all]
 
-            # Create reverse mapping
-            user_mapping_inv = {idx: user for user, idx in self.user_mapping.items()}
-            issue_mapping_inv = {idx: number for number, idx in self.issue_mapping.items()}
+            self.build_user_index(user_embs)
 
             # Process issue nodes in the test set
             for batch in self.test_loader:
@@ -163,29 +166,18 @@ class N2VHGNN(GraphBaseModel):
                 # Extract corresponding issue node embeddings from the updated node embeddings
                 issue_embs = outputs[issue_indices]
 
-                # Calculate the similarity between issues and all users
-                scores = torch.matmul(issue_embs, user_embs.T)  # [num_issues, num_users]
-                probabilities = torch.sigmoid(scores)
-
-                # Retrieve the top K users for each issue
-                top_k = self.topk
-                top_k_scores, top_k_indices = torch.topk(probabilities, k=top_k, dim=1)
-
-                # Map user indices to usernames
-                user_indices_np = user_indices[top_k_indices].cpu().numpy()
-                user_names_array = np.vectorize(user_mapping_inv.get)(user_indices_np)
+                # Retrieve the top K users for each issue from the index
+                top_k_scores, top_k_indices = self.search_users(issue_embs)
 
-                # Retrieve corresponding issue numbers
-                issue_global_indices = issue_indices.cpu().numpy()
-                issue_numbers = [issue_mapping_inv[idx] for idx in issue_global_indices]
+                # Map user indices to usernames and issue indices to issue numbers
+                issue_numbers, user_names_array = self.record_predictions(
+                    issue_indices.cpu().numpy(), user_indices.cpu()[top_k_indices].numpy(), top_k_scores.cpu().numpy()
+                )
 
                 # Save prediction results
                 for issue_number, user_names, scores in zip(issue_numbers, user_names_array, top_k_scores.cpu().numpy()):
                     probabilities_list = scores.tolist()
                     user_names_list = user_names.tolist()
-                    self.save_issue_assign(
-                        self.owner, self.name, issue_number,
-                        probabilities_list, user_names_list, self.issue_assign_collection
-                    )
+                    self.save_issue_assign(issue_number, probabilities_list, user_names_list)
 
     
@@ -0,0 +1,227 @@
+import os
+import json
+import hashlib
+import torch
+from torch.utils.data import DataLoader
+from torch_geometric.nn import Node2Vec
+from .walkcorpus import WalkCorpus
+from .finetune import remap_rows
+
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+def graph_manifest(edge_index, num_nodes):
+    '''
+    Describe the homogeneous graph the random walks run on,
+    the digest changes whenever any edge changes
+    '''
+    edge_bytes = edge_index.detach().cpu().contiguous().numpy().tobytes()
+    return {
+        'num_nodes': int(num_nodes),
+        'num_edges': int(edge_index.size(1)),
+        'edge_index_sha256': hashlib.sha256(edge_bytes).hexdigest()
+    }
+
+class Node2VecPretrainer:
+    '''
+    Trains the Node2Vec embeddings shared by node2vec and n2vhgnn.
+    Results are cached under cache_dir keyed by graph manifest,
+    walk/optimizer hyperparameters and seed, so a model only retrains
+    when one of them changes. A training run saves its embedding table and
+    optimizer to checkpoint_path every checkpoint_interval epochs and an
+    interrupted run with the same cache key resumes from there.
+    '''
+    def __init__(self, edge_index, num_nodes, hyperparameter, batch_size, learning_rate, epoch, log,
+                 seed=None, cache_dir='./cache/', checkpoint_path=None, checkpoint_interval=1, profiled=None):
+        self.edge_index = edge_index
+        self.num_nodes = num_nodes
+        self.embedding_dim = int(hyperparameter.get('embedding_dim', 64))
+        self.walk_length = int(hyperparameter.get('walk_length', 20))
+        self.context_size = int(hyperparameter.get('context_size', 10))
+        self.walks_per_node = int(hyperparameter.get('walks_per_node', 10))
+        self.num_negative_samples = int(hyperparameter.get('num_negative_samples', 1))
+        self.p = float(hyperparameter.get('p', 1.0))
+        self.q = float(hyperparameter.get('q', 1.0))
+        # Precompute the walks once across a process pool instead of sampling them every epoch
+        self.walk_corpus = bool(int(hyperparameter.get('walk_corpus', 0)))
+        self.walk_workers = int(hyperparameter.get('walk_workers', 0)) or None
+        # Sparse gradients only touch the embedding rows of the batch, paired with SparseAdam
+        self.sparse = bool(int(hyperparameter.get('sparse', 0)))
+        self.batch_size = int(batch_size)
+        self.learning_rate = float(learning_rate)
+        self.epoch = int(epoch)
+        self.log = log
+        self.seed = seed
+        self.cache_dir = os.path.join(cache_dir, 'node2vec')
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = max(1, int(checkpoint_interval))
+        # Wraps the walk loader so the model's profiler steps with every batch
+        self.profiled = profiled
+
+    def params(self):
+        return {
+            'embedding_dim': self.embedding_dim,
+            'walk_length': self.walk_length,
+            'context_size': self.context_size,
+            'walks_per_node': self.walks_per_node,
+            'num_negative_samples': self.num_negative_samples,
+            'p': self.p,
+            'q': self.q,
+            'walk_corpus': self.walk_corpus,
+            'sparse': self.sparse,
+            'batch_size': self.batch_size,
+            'learning_rate': self.learning_rate,
+            'epoch': self.epoch
+        }
+
+    def cache_key(self, manifest):
+        payload = json.dumps({'graph': manifest, 'params': self.params(), 'seed': self.seed}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    def build(self):
+        return Node2Vec(
+            edge_index=self.edge_index,
+            embedding_dim=self.embedding_dim,
+            walk_length=self.walk_length,
+            context_size=self.context_size,
+            walks_per_node=self.walks_per_node,
+            p=self.p,
+            q=self.q,
+            num_negative_samples=self.num_negative_samples,
+            num_nodes=self.num_nodes,
+            sparse=self.sparse,
+        ).to(device)
+
+    def build_optimizer(self, node2vec):
+        if self.sparse:
+            return torch.optim.SparseAdam(list(node2vec.parameters()), lr=self.learning_rate)
+        return torch.optim.Adam(list(node2vec.parameters()), lr=self.learning_rate)
+
+    def fit(self, init_embedding=None, start_nodes=None):
+        '''
+        Return a Node2Vec module holding trained embeddings,
+        loaded from the cache when an identical run already exists.
+        init_embedding warm-starts the table for fine-tuning, walking
+        only from start_nodes, and bypasses the cache
+        '''
+        manifest = graph_manifest(self.edge_index, self.num_nodes)
+        key = self.cache_key(manifest)
+        cache_path = os.path.join(self.cache_dir, key + '.pt')
+
+        if self.seed is not None:
+            torch.manual_seed(int(self.seed))
+        node2vec = self.build()
+
+        if init_embedding is not None:
+            node2vec.embedding.weight.data.copy_(init_embedding)
+            if self.epoch > 0 and len(start_nodes) > 0:
+                self.train(node2vec, DataLoader(start_nodes.tolist(), batch_size=self.batch_size,
+                                                shuffle=True, collate_fn=node2vec.sample))
+            return node2vec
+
+        if os.path.exists(cache_path):
+            self.log.info(f'Loading cached Node2Vec embeddings ({key})...')
+            cached = torch.load(cache_path, map_location=device)
+            node2vec.embedding.weight.data.copy_(cached['embedding'])
+            return node2vec
+
+        self.train(node2vec, self.walk_loader(node2vec, manifest), key)
+
+        # Write to a temporary file first so concurrent runs never read a partial cache
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        torch.save({
+            'embedding': node2vec.embedding.weight.detach().cpu(),
+            'graph': manifest,
+            'params': self.params(),
+            'seed': self.seed
+        }, tmp_path)
+        os.replace(tmp_path, cache_path)
+        self.log.info(f'Node2Vec embeddings cached ({key}).')
+        return node2vec
+
+    def walk_loader(self, node2vec, manifest):
+        if not self.walk_corpus:
+            return node2vec.loader(batch_size=self.batch_size, shuffle=True)
+        # The corpus only depends on the graph and the walk parameters, so it outlives optimizer changes
+        walk_params = {k: v for k, v in self.params().items() if k in ('walk_length', 'walks_per_node', 'p', 'q')}
+        payload = json.dumps({'graph': manifest, 'walks': walk_params, 'seed': self.seed}, sort_keys=True)
+        path = os.path.join(self.cache_dir, 'walks_' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32] + '.npy')
+        self.log.info('Generating Node2Vec walk corpus...')
+        return WalkCorpus.build(node2vec, path, self.batch_size, num_workers=self.walk_workers, seed=self.seed)
+
+    def train(self, node2vec, loader, key=None):
+        '''
+        key identifies a full training run, only those are checkpointed
+        '''
+        optimizer = self.build_optimizer(node2vec)
+        checkpointed = key is not None and self.checkpoint_path is not None
+        start_epoch = self.resume(node2vec, optimizer, key) if checkpointed else 0
+        self.log.info('Training Node2Vec Embeddings...')
+        node2vec.train()
+        for epoch in range(start_epoch + 1, self.epoch + 1):
+            total_loss = 0
+            for pos_rw, neg_rw in (self.profiled(loader) if self.profiled else loader):
+                optimizer.zero_grad()
+                loss = node2vec.loss(pos_rw.to(device), neg_rw.to(device))
+                loss.backward()
+                optimizer.step()
+                total_loss += loss.item()
+            avg_loss = total_loss / len(loader)
+            self.log.info(f'Epoch: {epoch:03d}, Loss: {avg_loss:.4f}')
+            if checkpointed and epoch % self.checkpoint_interval == 0 and epoch < self.epoch:
+                self.save_progress(node2vec, optimizer, key, epoch)
+        # The embedding cache takes over once the run is complete
+        if checkpointed and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.log.info('Node2Vec Embeddings Training Complete.')
+
+    def save_progress(self, node2vec, optimizer, key, epoch):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        # Write to a temporary file first so an interrupted save never corrupts the checkpoint
+        torch.save({
+            'key': key,
+            'epoch': epoch,
+            'embedding': node2vec.embedding.weight.detach().cpu(),
+            'optimizer': optimizer.state_dict()
+        }, self.checkpoint_path + '.tmp')
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+        self.log.debug(f'Node2Vec checkpoint saved: {self.checkpoint_path} (epoch {epoch})')
+
+    def resume(self, node2vec, optimizer, key):
+        '''
+        Restore an interrupted run of the same graph and parameters,
+        return the number of epochs it already completed
+        '''
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        checkpoint = torch.load(self.checkpoint_path, map_location=device)
+        if checkpoint['key'] != key:
+            self.log.info('Node2Vec checkpoint belongs to another graph or parameters, starting over.')
+            return 0
+        node2vec.embedding.weight.data.copy_(checkpoint['embedding'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        self.log.info(f"Resuming Node2Vec training at epoch {checkpoint['epoch'] + 1}.")
+        return checkpoint['epoch']
+
+class Node2VecEmbeddingMixin:
+    '''
+    Pretrainer construction and checkpoint growth shared by the models whose
+    node table is the Node2Vec embedding of the homogeneous graph. Their
+    checkpoint state keeps that table under 'embedding', next to their own keys
+    '''
+    def pretrainer(self):
+        return Node2VecPretrainer(
+            self.data.edge_index, self.data.num_nodes, self.hyperparameter,
+            self.batch_size, self.learning_rate, self.epoch, self.log,
+            seed=self.seed, cache_dir=self.cache_dir,
+            checkpoint_path=os.path.join(self.checkpoint_dir, 'node2vec.pt'),
+            checkpoint_interval=self.checkpoint_interval,
+            profiled=self.profiled
+        )
+
+    def grow_state(self, state, previous):
+        # New nodes keep the fresh Node2Vec initialization, known ones their trained rows
+        embedding = self.pretrainer().build().embedding.weight.detach().cpu().clone()
+        new_rows = remap_rows(state['embedding'], previous['user_mapping'], embedding, self.user_mapping)
+        new_rows += remap_rows(state['embedding'], previous['issue_mapping'], embedding, self.issue_mapping)
+        return {**state, 'embedding': embedding}, new_rows
@@ -1,20 +1,21 @@
 from .registry import ModelRegistry
 from .graphbasemodel import GraphBaseModel
+from .n2vpretrain import Node2VecEmbeddingMixin
+from .export import split_node_embeddings
 import os
 import torch
-from torch_geometric.nn import Node2Vec
 import torch.nn.functional as F
 import torch.nn as nn
 from torch_geometric.loader import LinkNeighborLoader, NeighborLoader
 from datetime import datetime, timezone
 import numpy as np
-from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from tools.metrics import BinaryMetricAccumulator
 from torch_geometric.utils import negative_sampling
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
 @ModelRegistry.register('node2vec')
-class Node2VecModel(GraphBaseModel):
+class Node2VecModel(Node2VecEmbeddingMixin, GraphBaseModel):
     def __init__(self, config):
         super().__init__(config)
         self.config = config
@@ -23,7 +24,6 @@ class Node2VecModel(GraphBaseModel):
         self.context_size = int(self.config["hyperparameter"].get('context_size', 10))
         self.walks_per_node = int(self.config["hyperparameter"].get('walks_per_node', 10))
         self.num_negative_samples = int(self.config["hyperparameter"].get('num_negative_samples', 1))
-        # self.sparse = self.config["hyperparameter"].get('sparse', True)
         self.batch_size = int(self.config["batch_size"])
         self.learning_rate = float(self.config["learningRate"])
         self.epoch = int(self.config["epoch"])
@@ -32,38 +32,33 @@ class Node2VecModel(GraphBaseModel):
         
 
     def train(self):
-        self.node2vec = Node2Vec(
-            edge_index=self.data.edge_index,
-            embedding_dim=self.embedding_dim,
-            walk_length=self.walk_length,
-            context_size=self.context_size,
-            walks_per_node=self.walks_per_node,
-            num_negative_samples=self.num_negative_samples,
-            # sparse=self.sparse
-        ).to(device)
-        self.optimizer = torch.optim.Adam(list(self.node2vec.parameters()), lr=self.learning_rate)
-        self.log.info('Training Node2Vec Embeddings...')
-        self.node2vec.train()
-        loader = self.node2vec.loader(batch_size=self.batch_size, shuffle=True)
-        for epoch in range(1, self.epoch + 1):
-            total_loss = 0
-            for pos_rw, neg_rw in loader:
-                self.optimizer.zero_grad()
-                loss = self.node2vec.loss(pos_rw.to(device), neg_rw.to(device))
-                loss.backward()
-                self.optimizer.step()
-                total_loss += loss.item()
-            avg_loss = total_loss / len(loader)
-            self.log.info(f'Epoch: {epoch:03d}, Loss: {avg_loss:.4f}')
-        self.log.info('Node2Vec Embeddings Training Complete.')
+        '''
+        All Node2Vec epochs run inside the pretrainer, which checkpoints every
+        checkpoint_interval epochs and resumes from there, so the base epoch
+        loop is not used
+        '''
+        if self.start_epoch >= self.epoch:
+            return
+        if self.finetuning:
+            self.node2vec = self.pretrainer().fit(init_embedding=self.node_embeddings, start_nodes=self.finetune_nodes)
+        else:
+            self.node2vec = self.pretrainer().fit()
+        self.node_embeddings = self.node2vec.embedding.weight.detach()
+        self.start_epoch = self.epoch
+
+    def checkpoint_state(self):
+        return {'embedding': self.node_embeddings.cpu()}
+
+    def restore_checkpoint_state(self, state):
+        self.node2vec = self.pretrainer().build()
+        self.node2vec.embedding.weight.data.copy_(state['embedding'])
         self.node_embeddings = self.node2vec.embedding.weight.detach()
 
     def validate(self):
         self.log.info('Validating...')
         self.node2vec.eval()
         total_loss = 0
-        preds = []
-        labels = []
+        metrics = BinaryMetricAccumulator(threshold=0.4)
         with torch.no_grad():
             # Evaluate using positive and negative samples from the validation set
             edge_label_index = self.val_data.edge_label_index
@@ -79,13 +74,13 @@ class Node2VecModel(GraphBaseModel):
             loss = self.criterion(pred, edge_label.float().to(device))
             total_loss = loss.item()
 
-            preds = pred.cpu()
-            labels = edge_label.cpu()
-            pred_labels = (torch.sigmoid(preds) > 0.4).float()
-            accuracy = accuracy_score(labels, pred_labels)
-            f1 = f1_score(labels, pred_labels)
-            auc = roc_auc_score(labels.numpy(), torch.sigmoid(preds).numpy())
+            metrics.update(pred, edge_label)
+            accuracy, f1, auc = metrics.accuracy(), metrics.f1(), metrics.auc()
             self.log.info(f'Validation Loss: {total_loss:.4f}, Accuracy: {accuracy:.4f}, F1: {f1:.4f}, AUC: {auc:.4f}')
+            return {'loss': total_loss, 'accuracy': accuracy, 'f1': f1, 'auc': auc}
+
+    def scoring_tables(self):
+        return split_node_embeddings(self.node_embeddings, self.user_mapping, self.issue_mapping)
 
     def test(self):
         self.log.info('Testing...')
@@ -94,27 +89,19 @@ class Node2VecModel(GraphBaseModel):
             # Get user embedding (node_date==0)
             user_indices = torch.arange(self.data.num_nodes)[self.data.node_type == 0].to(device)
             user_embs = self.node_embeddings[user_indices]
-            user_mapping_inv = {idx: user for user, idx in self.user_mapping.items()}
-            issue_mapping_inv = {idx: number for number, idx in self.issue_mapping.items()}
+            self.build_user_index(user_embs)
 
             # Handling issues in the test set
             for batch in self.test_loader:
                 batch = batch.to(device)
                 issue_indices = batch.n_id
                 issue_embs = self.node_embeddings[issue_indices]
-                scores = torch.matmul(issue_embs, user_embs.T)  # [num_issues, num_users]
-                probabilities = torch.sigmoid(scores)
-                top_k = self.topk
-                top_k_scores, top_k_indices = torch.topk(probabilities, k=top_k, dim=1)
-                user_indices_np = user_indices[top_k_indices].cpu().numpy()
-                user_names_array = np.vectorize(user_mapping_inv.get)(user_indices_np)
-                issue_global_indices = issue_indices.cpu().numpy()
-                issue_numbers = [issue_mapping_inv[idx] for idx in issue_global_indices]
+                top_k_scores, top_k_indices = self.search_users(issue_embs)
+                issue_numbers, user_names_array = self.record_predictions(
+                    issue_indices.cpu().numpy(), user_indices.cpu()[top_k_indices].numpy(), top_k_scores.cpu().numpy()
+                )
 
                 for issue_number, user_names, scores in zip(issue_numbers, user_names_array, top_k_scores.cpu().numpy()):
                     probabilities_list = scores.tolist()
                     user_names_list = user_names.tolist()
-                    self.save_issue_assign(
-                        self.owner, self.name, issue_number,
-                        probabilities_list, user_names_list, self.issue_assign_collection
-                    )
+                    self.save_issue_assign(issue_number, probabilities_list, user_names_list)
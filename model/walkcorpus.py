@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import torch
+import multiprocessing as mp
+from torch_geometric.typing import WITH_PYG_LIB, WITH_TORCH_CLUSTER
+
+# Graph shared by the walk workers, set once per process by the pool initializer
+_worker_graph = {}
+
+def random_walk_fn(p, q):
+    '''
+    Pick the same random walk kernel that torch_geometric.nn.Node2Vec uses
+    '''
+    if WITH_PYG_LIB and p == 1.0 and q == 1.0:
+        return torch.ops.pyg.random_walk
+    if WITH_TORCH_CLUSTER:
+        return torch.ops.torch_cluster.random_walk
+    raise ImportError("Random walks require either the 'pyg-lib' or 'torch-cluster' package")
+
+def _init_worker(rowptr, col, path, walks_per_node, walk_length, p, q):
+    torch.set_num_threads(1)
+    _worker_graph.update(rowptr=rowptr, col=col, path=path, walks_per_node=walks_per_node,
+                         walk_length=walk_length, p=p, q=q)
+
+def _walk_chunk(task):
+    start, end, seed = task
+    g = _worker_graph
+    torch.manual_seed(seed)
+    nodes = torch.arange(start, end).repeat(g['walks_per_node'])
+    rw = random_walk_fn(g['p'], g['q'])(g['rowptr'], g['col'], nodes, g['walk_length'], g['p'], g['q'])
+    if not isinstance(rw, torch.Tensor):
+        rw = rw[0]
+    # Every chunk owns a disjoint row range, so workers write to the memmap without locking
+    corpus = np.load(g['path'], mmap_mode='r+')
+    corpus[start * g['walks_per_node']:end * g['walks_per_node']] = rw.numpy().astype(np.int32)
+    corpus.flush()
+    return end - start
+
+class WalkCorpus:
+    '''
+    Random walks generated once by a process pool and stored as an
+    int32 memmap of shape [num_nodes * walks_per_node, walk_length + 1].
+    Iterating yields (pos_rw, neg_rw) batches in the same layout as
+    Node2Vec.loader, reshuffled on every pass.
+    '''
+    def __init__(self, path, num_nodes, walks_per_node, walk_length, context_size, num_negative_samples, batch_size):
+        self.path = path
+        self.corpus = np.load(path, mmap_mode='r')
+        self.num_nodes = num_nodes
+        self.walks_per_node = walks_per_node
+        self.walk_length = walk_length
+        self.context_size = context_size
+        self.num_negative_samples = num_negative_samples
+        # One batch holds the walks of batch_size start nodes, as Node2Vec.loader does
+        self.walks_per_batch = batch_size * walks_per_node
+
+    @classmethod
+    def build(cls, node2vec, path, batch_size, num_workers=None, seed=None, chunk_size=4096):
+        '''
+        Generate the corpus for node2vec's graph unless path already holds one
+        '''
+        num_nodes = node2vec.num_nodes
+        shape = (num_nodes * node2vec.walks_per_node, node2vec.walk_length + 1)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp.npy'
+            np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.int32, shape=shape).flush()
+
+            base_seed = int(seed) if seed is not None else int(torch.randint(2 ** 31 - 1, (1,)))
+            tasks = [(start, min(start + chunk_size, num_nodes), base_seed + i)
+                     for i, start in enumerate(range(0, num_nodes, chunk_size))]
+            num_workers = num_workers or os.cpu_count() or 1
+            initargs = (node2vec.rowptr, node2vec.col, tmp_path, node2vec.walks_per_node,
+                        node2vec.walk_length, node2vec.p, node2vec.q)
+            with mp.get_context('spawn').Pool(min(num_workers, len(tasks)), _init_worker, initargs) as pool:
+                for _ in pool.imap_unordered(_walk_chunk, tasks):
+                    pass
+            os.replace(tmp_path, path)
+
+        return cls(path, num_nodes, node2vec.walks_per_node, node2vec.walk_length,
+                   node2vec.context_size, node2vec.num_negative_samples, batch_size)
+
+    def __len__(self):
+        return (self.corpus.shape[0] + self.walks_per_batch - 1) // self.walks_per_batch
+
+    def __iter__(self):
+        perm = torch.randperm(self.corpus.shape[0]).numpy()
+        for i in range(0, perm.shape[0], self.walks_per_batch):
+            # Sorted row indices keep reads from the memmap sequential
+            rows = np.sort(perm[i:i + self.walks_per_batch])
+            rw = torch.from_numpy(self.corpus[rows].astype(np.int64))
+            yield self.windows(rw), self.neg_sample(rw[:, 0])
+
+    def windows(self, rw):
+        num_walks_per_rw = 1 + self.walk_length + 1 - self.context_size
+        return torch.cat([rw[:, j:j + self.context_size] for j in range(num_walks_per_rw)], dim=0)
+
+    def neg_sample(self, start):
+        start = start.repeat(self.num_negative_samples)
+        rw = torch.randint(self.num_nodes, (start.size(0), self.walk_length), dtype=start.dtype)
+        return self.windows(torch.cat([start.view(-1, 1), rw], dim=-1))
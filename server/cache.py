@@ -0,0 +1,103 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+class TTLCache():
+    '''
+    Bounded LRU cache. An entry is dropped once it is older than ttl seconds
+    or when the version stamp it was stored with is no longer current, so
+    a completed model run invalidates its repository's entries
+    '''
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def get(self, key, stamp=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, entry_stamp, expires = entry
+        if expires < time.monotonic() or entry_stamp != stamp:
+            del self.entries[key]
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, stamp=None, ttl=None):
+        '''
+        ttl overrides the cache's ttl for this entry, e.g. a shorter one for
+        a response that may soon be completed
+        '''
+        self.entries[key] = (value, stamp, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_latency(self, hit, seconds):
+        if hit:
+            self.hit_seconds += seconds
+        else:
+            self.miss_seconds += seconds
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'avg_hit_ms': 1000 * self.hit_seconds / self.hits if self.hits else 0.0,
+            'avg_miss_ms': 1000 * self.miss_seconds / self.misses if self.misses else 0.0
+        }
+
+class SingleFlight():
+    '''
+    Coalesces concurrent calls with the same key into one in-flight fetch,
+    every caller awaits its result or exception. The fetch is shielded, so
+    a disconnecting caller does not cancel it for the others
+    '''
+    def __init__(self):
+        self.inflight = {}
+        self.fetches = 0
+        self.coalesced = 0
+
+    async def do(self, key, fetch):
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        self.fetches += 1
+        future = asyncio.ensure_future(fetch())
+        self.inflight[key] = future
+        future.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(future)
+
+    def forget(self, key, future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        # Retrieve the exception, nobody may be left awaiting it
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self):
+        return {
+            'inflight': len(self.inflight),
+            'fetches': self.fetches,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,82 @@
+import asyncio
+
+class FeedbackBuffer():
+    '''
+    Bounded in-memory queue of feedback documents. A background task writes
+    them with insert_many once batch_size are queued or flush_interval
+    seconds have passed, so a vote never waits on MongoDB. submit() refuses
+    documents while the queue is full, and close() drains what is left
+    '''
+    def __init__(self, collection, maxsize=10000, batch_size=100, flush_interval=1.0):
+        self.collection = collection
+        self.queue = asyncio.Queue(maxsize=int(maxsize))
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.closing = False
+        self.task = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def submit(self, document):
+        if self.closing:
+            return False
+        try:
+            self.queue.put_nowait(document)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def run(self):
+        while not (self.closing and self.queue.empty()):
+            batch = await self.next_batch()
+            if batch:
+                await self.insert(batch)
+
+    async def next_batch(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            if self.closing and self.queue.empty():
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def insert(self, batch):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error inserting feedback: {e}")
+
+    async def close(self):
+        '''
+        Stop accepting feedback and wait until the queued documents are written
+        '''
+        self.closing = True
+        if self.task is not None:
+            await self.task
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'maxsize': self.queue.maxsize,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'written': self.written,
+            'failed': self.failed
+        }
@@ -0,0 +1,186 @@
+'''
+Minimal scoring runtime for the artifacts written by GraphBaseModel.export.
+
+Only numpy and either torch (TorchScript) or onnxruntime (ONNX) are imported,
+never torch_geometric, easygraph or the training code. Example:
+
+    scorer = ExportedScorer('./export/X-lab2017_open-digger/hgraphsage')
+    scorer.recommend(1024)                 # issue already in the graph
+    scorer.recommend_features(features)    # new issue, HGraphSage only
+    scorer.recommend_text(title, body)     # new issue from its text, HGraphSage only
+
+Text is cleaned with tools/nlp.py, which needs the repository root on
+sys.path, and vectorized from the exported vocabularies with numpy.
+
+EmbeddingScorer only needs numpy, it scores the exported embedding tables
+directly and is what the server falls back to for missing predictions.
+'''
+import os
+import re
+import glob
+import json
+import numpy as np
+
+def blocked_topk(query, table, k, block_size=65536):
+    '''
+    Rows and inner products of the k rows of table closest to query, read one
+    block at a time so a memory-mapped table is never loaded whole
+    '''
+    best_rows = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+    for start in range(0, len(table), block_size):
+        scores = np.asarray(table[start:start + block_size], dtype=np.float32) @ query
+        rows = np.arange(start, start + len(scores))
+        best_rows = np.concatenate([best_rows, rows])
+        best_scores = np.concatenate([best_scores, scores])
+        if len(best_scores) > k:
+            keep = np.argpartition(-best_scores, k - 1)[:k]
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+    order = np.argsort(-best_scores, kind='stable')
+    return best_rows[order], best_scores[order]
+
+class EmbeddingScorer():
+    '''
+    Scores exported issues against the exported user table with numpy alone.
+    The tables are memory-mapped read-only, so every process serving the
+    same export shares their pages
+    '''
+    def __init__(self, export_dir):
+        self.export_dir = export_dir
+        with open(os.path.join(export_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(export_dir, 'user_ids.json')) as f:
+            self.user_ids = json.load(f)
+        with open(os.path.join(export_dir, 'issue_numbers.json')) as f:
+            self.issue_rows = {number: row for row, number in enumerate(json.load(f))}
+        self.user_embeddings = np.load(os.path.join(export_dir, 'user_embeddings.npy'), mmap_mode='r')
+        self.issue_embeddings = np.load(os.path.join(export_dir, 'issue_embeddings.npy'), mmap_mode='r')
+        # Files are replaced one by one, a load during an export can mix two of them
+        if len(self.user_embeddings) != len(self.user_ids) or len(self.issue_embeddings) != len(self.issue_rows):
+            raise ValueError(f'Export {export_dir} is being rewritten, load it again once the export finished.')
+
+    def __contains__(self, number):
+        return number in self.issue_rows
+
+    def recommend(self, number, k=None, block_size=65536):
+        if number not in self.issue_rows:
+            raise KeyError(f'Issue {number} was not exported.')
+        query = np.asarray(self.issue_embeddings[self.issue_rows[number]], dtype=np.float32)
+        rows, scores = blocked_topk(query, self.user_embeddings, k or self.meta['topk'], block_size)
+        return [self.user_ids[i] for i in rows], (1 / (1 + np.exp(-scores))).tolist()
+
+def load_embedding_scorers(export_root):
+    '''
+    EmbeddingScorer of every export under export_root, keyed by (owner, name) and then model
+    '''
+    scorers = {}
+    for meta_path in sorted(glob.glob(os.path.join(export_root, '*', '*', 'meta.json'))):
+        scorer = EmbeddingScorer(os.path.dirname(meta_path))
+        scorers.setdefault((scorer.meta['owner'], scorer.meta['name']), {})[scorer.meta['model']] = scorer
+    return scorers
+
+class TfidfTable():
+    '''
+    transform of a fitted unigram TfidfVectorizer from its exported vocabulary and idf
+    '''
+    def __init__(self, table):
+        self.vocabulary = table['vocabulary']
+        self.idf = np.asarray(table['idf'], dtype=np.float32)
+        self.token_pattern = re.compile(table['token_pattern'])
+        self.lowercase = table['lowercase']
+        self.sublinear_tf = table['sublinear_tf']
+        self.norm = table['norm']
+
+    def __call__(self, text):
+        if self.lowercase:
+            text = text.lower()
+        tf = np.zeros(len(self.idf), dtype=np.float32)
+        for token in self.token_pattern.findall(text):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                tf[index] += 1
+        if self.sublinear_tf:
+            np.log(tf, out=tf, where=tf > 0)
+            tf[tf != 0] += 1
+        features = tf * self.idf
+        if self.norm == 'l2':
+            norm = np.linalg.norm(features)
+        elif self.norm == 'l1':
+            norm = np.abs(features).sum()
+        else:
+            norm = 0
+        return features / norm if norm > 0 else features
+
+class TextFeaturizer():
+    '''
+    Issue tower features of a title and body, the same as IssueFeaturizer
+    computes during training
+    '''
+    def __init__(self, tables):
+        self.title = TfidfTable(tables['title'])
+        self.body = TfidfTable(tables['body'])
+
+    def __call__(self, title, body):
+        from tools.nlp import clean_text
+        return np.concatenate([self.title(clean_text(title or '')), self.body(clean_text(body or ''))])[None, :]
+
+class ExportedScorer(EmbeddingScorer):
+    def __init__(self, export_dir):
+        super().__init__(export_dir)
+        self.scorer = self.load('scorer')
+        self.issue_tower = self.load('issue_tower') if self.meta['issue_tower'] else None
+        self.featurizer = None
+        if self.meta.get('featurizer'):
+            with open(os.path.join(export_dir, 'featurizer.json')) as f:
+                self.featurizer = TextFeaturizer(json.load(f))
+
+    def load(self, name):
+        if self.meta['format'] == 'onnx':
+            import onnxruntime
+            session = onnxruntime.InferenceSession(os.path.join(self.export_dir, name + '.onnx'),
+                                                   providers=['CPUExecutionProvider'])
+            input_name = session.get_inputs()[0].name
+            return lambda x: session.run(None, {input_name: x})
+        import torch
+        module = torch.jit.load(os.path.join(self.export_dir, name + '.pt'), map_location='cpu').eval()
+        def run(x):
+            with torch.no_grad():
+                out = module(torch.from_numpy(x))
+            return [t.numpy() for t in out] if isinstance(out, tuple) else [out.numpy()]
+        return run
+
+    def score(self, issue_embs):
+        '''
+        Top-k (user ids, probabilities) for each row of issue embeddings
+        '''
+        probabilities, indices = self.scorer(np.ascontiguousarray(issue_embs, dtype=np.float32))
+        return [([self.user_ids[i] for i in row], prob.tolist()) for row, prob in zip(indices, probabilities)]
+
+    def recommend(self, number, k=None, block_size=65536):
+        '''
+        Scored by the exported scorer module, whose top-k is fixed at export
+        time, other k fall back to the numpy scan
+        '''
+        if k is not None and k != self.meta['topk']:
+            return super().recommend(number, k, block_size)
+        if number not in self.issue_rows:
+            raise KeyError(f'Issue {number} was not exported, score it by features instead.')
+        return self.score(self.issue_embeddings[self.issue_rows[number]][None, :])[0]
+
+    def recommend_features(self, features):
+        '''
+        Score issues that are not in the graph from their raw feature vectors
+        '''
+        if self.issue_tower is None:
+            raise ValueError(f"Model {self.meta['model']} has no issue tower, only exported issues can be scored.")
+        features = np.atleast_2d(np.asarray(features, dtype=np.float32))
+        issue_embs = self.issue_tower(features)[0]
+        return self.score(issue_embs)
+
+    def recommend_text(self, title, body):
+        '''
+        Score a new issue from its title and body
+        '''
+        if self.featurizer is None:
+            raise ValueError(f"Export {self.export_dir} has no featurizer, score it by features instead.")
+        return self.recommend_features(self.featurizer(title, body))[0]
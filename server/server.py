@@ -1,11 +1,111 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
-from pymongo import MongoClient
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
 from fastapi.middleware.cors import CORSMiddleware
 import datetime
+from cache import TTLCache, SingleFlight
+from feedback import FeedbackBuffer
+from runtime import load_embedding_scorers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data.indexes import ensure_indexes_async, check_query_plans_async
 
-app = FastAPI()
+# MongoDB Connection, configurable per deployment
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB = os.environ.get('MONGO_DB', 'GFI-TEST1')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+# Response caches, invalidated by the active prediction versions polled every CACHE_VERSION_POLL seconds
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+CACHE_VERSION_POLL = float(os.environ.get('CACHE_VERSION_POLL', 5))
+# Responses missing a model that ran out of scoring time are kept only briefly
+CACHE_PARTIAL_TTL = float(os.environ.get('CACHE_PARTIAL_TTL', 5))
+# Upper bound on the issue numbers of one /get_issue_resolvers_batch request
+BATCH_MAX_ISSUES = int(os.environ.get('BATCH_MAX_ISSUES', 500))
+# Feedback is queued in memory and written in batches of FEEDBACK_BATCH_SIZE or every FEEDBACK_FLUSH_INTERVAL seconds
+FEEDBACK_QUEUE_SIZE = int(os.environ.get('FEEDBACK_QUEUE_SIZE', 10000))
+FEEDBACK_BATCH_SIZE = int(os.environ.get('FEEDBACK_BATCH_SIZE', 100))
+FEEDBACK_FLUSH_INTERVAL = float(os.environ.get('FEEDBACK_FLUSH_INTERVAL', 1))
+# Create the collection indexes at startup and warn about hot queries that still scan a collection
+MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', '1') == '1'
+# Exported embeddings score the (issue, model) pairs a run did not store, within ONLINE_SCORING_BUDGET seconds
+EXPORT_DIR = os.environ.get('EXPORT_DIR', '../export')
+ONLINE_SCORING_BUDGET = float(os.environ.get('ONLINE_SCORING_BUDGET', 0.5))
+ONLINE_SCORING_WORKERS = int(os.environ.get('ONLINE_SCORING_WORKERS', 2))
+ONLINE_SCORING_BLOCK = int(os.environ.get('ONLINE_SCORING_BLOCK', 65536))
+
+resolver_cache = TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+developer_stats_cache = TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+# Concurrent misses on the same key share one MongoDB fetch
+resolver_flights = SingleFlight()
+developer_stats_flights = SingleFlight()
+version_stamps = {}
+online_scoring_stats = {"scored": 0, "timeouts": 0}
+
+async def poll_versions(versions_collection):
+    '''
+    Keep the active run version of every (owner, name, model) in memory, a
+    single small query per interval instead of one per request
+    '''
+    while True:
+        try:
+            stamps = {}
+            async for v in versions_collection.find({}, {"_id": 0, "owner": 1, "name": 1, "model": 1, "run_version": 1}):
+                stamps.setdefault((v["owner"], v["name"]), {})[v["model"]] = v["run_version"]
+            version_stamps.clear()
+            version_stamps.update(stamps)
+        except Exception as e:
+            print(f"Error polling prediction versions: {e}")
+        await asyncio.sleep(CACHE_VERSION_POLL)
+
+def repo_stamp(owner, name):
+    return frozenset(version_stamps.get((owner, name), {}).items())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled async client per worker process, created once the event loop is running
+    mongo_client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE, minPoolSize=MONGO_MIN_POOL_SIZE)
+    db = mongo_client[MONGO_DB]
+    app.state.issue_assign_collection = db['issue_assign']
+    app.state.issue_assign_versions = db['issue_assign_versions']
+    app.state.feedback_collection = db['feedback']
+    app.state.developer_avg_response = db['developer_metrics']
+    if MONGO_ENSURE_INDEXES:
+        try:
+            await ensure_indexes_async(db)
+            for collection, query in await check_query_plans_async(db):
+                print(f"Warning: COLLSCAN on {collection} for {query}")
+        except Exception as e:
+            print(f"Error ensuring indexes: {e}")
+    try:
+        app.state.embedding_scorers = load_embedding_scorers(EXPORT_DIR)
+    except Exception as e:
+        print(f"Error loading exported embeddings: {e}")
+        app.state.embedding_scorers = {}
+    app.state.scoring_executor = ThreadPoolExecutor(max_workers=ONLINE_SCORING_WORKERS)
+    app.state.feedback_buffer = FeedbackBuffer(app.state.feedback_collection, FEEDBACK_QUEUE_SIZE,
+                                               FEEDBACK_BATCH_SIZE, FEEDBACK_FLUSH_INTERVAL)
+    app.state.feedback_buffer.start()
+    poller = asyncio.create_task(poll_versions(app.state.issue_assign_versions))
+    try:
+        yield
+    finally:
+        poller.cancel()
+        # Write the feedback still queued before the connection goes away
+        await app.state.feedback_buffer.close()
+        app.state.scoring_executor.shutdown(wait=False)
+        mongo_client.close()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 app.add_middleware(
@@ -16,24 +116,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB Connection
-mongo_client = MongoClient('mongodb://localhost:27017/')
-db = mongo_client['GFI-TEST1']
-issue_assign_collection = db['issue_assign']
-feedback_collection = db['feedback']
-developer_avg_response = db['developer_metrics']
-
 # Data Model Definition
 class IssueRequest(BaseModel):
     owner: str
     name: str
     number: int
+    # Embed each assignee's developer stats, saving the /get_developer_stats round trip
+    include_stats: bool = False
 
 class ModelRecommendation(BaseModel):
     model: str
     assignee: List[str]
     probability: List[float]
     last_updated: str
+    # Aligned with assignee, only present when include_stats was requested
+    stats: Optional[List[dict]] = None
 
 class IssueAssignResponse(BaseModel):
     owner: str
@@ -41,6 +138,11 @@ class IssueAssignResponse(BaseModel):
     number: int
     recommendations: List[ModelRecommendation]
 
+class BatchIssueRequest(BaseModel):
+    owner: str
+    name: str
+    numbers: List[int] = Field(min_length=1, max_length=BATCH_MAX_ISSUES)
+
 class FeedbackRequest(BaseModel):
     user: str
     feedback: str
@@ -49,17 +151,74 @@ class FeedbackRequest(BaseModel):
     number: int
     model: str
 
-@app.post("/get_issue_resolvers", response_model=IssueAssignResponse)
+@app.post("/get_issue_resolvers", response_model=IssueAssignResponse, response_model_exclude_none=True)
 async def get_issue_resolvers(request: IssueRequest):
+    start = time.perf_counter()
+    key = (request.owner, request.name, request.number)
+    response = resolver_cache.get(key, repo_stamp(request.owner, request.name))
+    hit = response is not None
+    if not hit:
+        response = await resolver_flights.do(key, lambda: load_issue_resolvers(*key))
+    resolver_cache.record_latency(hit, time.perf_counter() - start)
+    if request.include_stats:
+        response = await with_developer_stats(response)
+    return response
+
+async def with_developer_stats(response):
+    '''
+    Copy of a resolver response with every recommendation carrying the stats
+    of its assignees, fetched by one lookup over the assignees of all models
+    '''
+    developers = {dev for recommendation in response["recommendations"] for dev in recommendation["assignee"]}
+    found_devs = await lookup_developer_stats(response["owner"], response["name"], developers)
+    # The cached response is shared between requests, so it is never modified
+    return {
+        **response,
+        "recommendations": [
+            {**recommendation, "stats": [found_devs[dev] for dev in recommendation["assignee"]]}
+            for recommendation in response["recommendations"]
+        ]
+    }
+
+async def load_issue_resolvers(owner, name, number):
+    response, stamp, complete = await fetch_issue_resolvers(owner, name, number)
+    resolver_cache.set((owner, name, number), response, stamp, None if complete else CACHE_PARTIAL_TTL)
+    return response
+
+def active_run_filter(active_versions):
+    '''
+    Query clause for each model's active run, or its unversioned legacy
+    documents while it has none, so a run still being written stays invisible
+    '''
+    return {"$or": [
+        {"run_version": {"$in": list(active_versions.values())}},
+        {"model": {"$nin": list(active_versions)}, "run_version": {"$exists": False}}
+    ]}
+
+async def fetch_issue_resolvers(owner, name, number):
+    '''
+    Recommendations of every model's active run for one issue and the
+    version stamp they belong to, 404 when there are none. Models that have
+    an export but stored nothing for the issue are scored on the fly,
+    complete is False when that ran out of time for one of them
+    '''
+    # The pointers are read first, a run activated after them is served by the next request
+    active_versions = {v["model"]: v["run_version"] async for v in app.state.issue_assign_versions.find(
+        {"owner": owner, "name": name}, {"_id": 0, "model": 1, "run_version": 1})}
     # Search for the recommended results corresponding to this issue
-    results = issue_assign_collection.find({
-        "owner": request.owner,
-        "name": request.name,
-        "number": request.number
-    })
+    results = await app.state.issue_assign_collection.find({
+        "owner": owner,
+        "name": name,
+        "number": number,
+        **active_run_filter(active_versions)
+    }).to_list(None)
 
     recommendations = []
     for result in results:
+        model = result.get("model", "unknown")
+        # $in matches the active version of any model, a document only counts for its own
+        if result.get("run_version") != active_versions.get(model):
+            continue
         recommendations.append({
             "model": result.get("model", "unknown"),
             "assignee": result["assignee"],
@@ -67,17 +226,90 @@ async def get_issue_resolvers(request: IssueRequest):
             "last_updated": result["last_updated"].strftime('%Y-%m-%d %H:%M:%S')
         })
 
+    stored = {recommendation["model"] for recommendation in recommendations}
+    missing = [(model, scorer) for model, scorer in app.state.embedding_scorers.get((owner, name), {}).items()
+               if model not in stored and number in scorer]
+    online = await asyncio.gather(*(score_online(model, scorer, number) for model, scorer in missing))
+    recommendations.extend(recommendation for recommendation in online if recommendation is not None)
+
     if not recommendations:
         raise HTTPException(status_code=404, detail="Issue assignments not found.")
 
     response = {
-        "owner": request.owner,
-        "name": request.name,
-        "number": request.number,
+        "owner": owner,
+        "name": name,
+        "number": number,
         "recommendations": recommendations
     }
 
-    return response
+    complete = all(recommendation is not None for recommendation in online)
+    return response, frozenset(active_versions.items()), complete
+
+async def score_online(model, scorer, number):
+    '''
+    Blocked top-k of one exported model in the scoring thread pool, None
+    when it does not finish within the latency budget
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        assignees, probabilities = await asyncio.wait_for(
+            loop.run_in_executor(app.state.scoring_executor, scorer.recommend, number, None, ONLINE_SCORING_BLOCK),
+            ONLINE_SCORING_BUDGET)
+    except asyncio.TimeoutError:
+        online_scoring_stats["timeouts"] += 1
+        return None
+    online_scoring_stats["scored"] += 1
+    return {
+        "model": model,
+        "assignee": assignees,
+        "probability": probabilities,
+        "last_updated": datetime.datetime.fromisoformat(scorer.meta["exported_at"]).strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+@app.post("/get_issue_resolvers_batch")
+async def get_issue_resolvers_batch(request: BatchIssueRequest):
+    '''
+    Recommendations for many issues of one repository from a single $in
+    query, streamed as NDJSON: one line per requested issue with the
+    recommendations grouped by model, empty when the issue has none
+    '''
+    numbers = list(dict.fromkeys(request.numbers))
+    active_versions = {v["model"]: v["run_version"] async for v in app.state.issue_assign_versions.find(
+        {"owner": request.owner, "name": request.name}, {"_id": 0, "model": 1, "run_version": 1})}
+    cursor = app.state.issue_assign_collection.find(
+        {"owner": request.owner, "name": request.name, "number": {"$in": numbers}, **active_run_filter(active_versions)},
+        {"_id": 0, "number": 1, "model": 1, "assignee": 1, "probability": 1, "last_updated": 1, "run_version": 1}
+    ).sort("number", 1)
+
+    def line(number, recommendations):
+        return json.dumps({"number": number, "recommendations": recommendations}) + "\n"
+
+    async def stream():
+        sent = set()
+        number, recommendations = None, {}
+        # Sorted by number, so an issue is complete once the next one starts
+        async for result in cursor:
+            if result["number"] != number:
+                if number is not None:
+                    sent.add(number)
+                    yield line(number, recommendations)
+                number, recommendations = result["number"], {}
+            model = result.get("model", "unknown")
+            if result.get("run_version") != active_versions.get(model):
+                continue
+            recommendations[model] = {
+                "assignee": result["assignee"],
+                "probability": result["probability"],
+                "last_updated": result["last_updated"].strftime('%Y-%m-%d %H:%M:%S')
+            }
+        if number is not None:
+            sent.add(number)
+            yield line(number, recommendations)
+        for missing in numbers:
+            if missing not in sent:
+                yield line(missing, {})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 @app.post("/submit_feedback")
 async def submit_feedback(request: FeedbackRequest):
@@ -95,14 +327,17 @@ async def submit_feedback(request: FeedbackRequest):
         "timestamp": datetime.datetime.utcnow()
     }
 
-    try:
-        feedback_collection.insert_one(feedback_data)
-    except Exception as e:
-        print(f"Error inserting feedback: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save feedback.")
+    # Acknowledged once queued, the buffer writes it in the background
+    if not app.state.feedback_buffer.submit(feedback_data):
+        raise HTTPException(status_code=503, detail="Too much feedback pending, try again later.",
+                            headers={"Retry-After": str(max(1, round(FEEDBACK_FLUSH_INTERVAL)))})
 
     return {"message": "Feedback submitted successfully."}
 
+@app.get("/feedback_stats")
+async def feedback_stats():
+    return app.state.feedback_buffer.stats()
+
 
 @app.post("/get_developer_stats")
 async def get_developer_stats(data: dict):
@@ -113,11 +348,33 @@ async def get_developer_stats(data: dict):
     if not owner or not name or not developers:
         raise HTTPException(status_code=400, detail="Missing parameters")
 
-    docs = list(developer_avg_response.find({
+    found_devs = await lookup_developer_stats(owner, name, developers)
+    result = [found_devs[dev] for dev in developers]
+    return result
+
+async def lookup_developer_stats(owner, name, developers):
+    start = time.perf_counter()
+    # The same developer set in any order shares one entry
+    key = (owner, name, tuple(sorted(set(developers))))
+    found_devs = developer_stats_cache.get(key, repo_stamp(owner, name))
+    hit = found_devs is not None
+    if not hit:
+        found_devs = await developer_stats_flights.do(key, lambda: load_developer_stats(key))
+    developer_stats_cache.record_latency(hit, time.perf_counter() - start)
+    return found_devs
+
+async def load_developer_stats(key):
+    owner, name, developers = key
+    found_devs = await fetch_developer_stats(owner, name, developers)
+    developer_stats_cache.set(key, found_devs, repo_stamp(owner, name))
+    return found_devs
+
+async def fetch_developer_stats(owner, name, developers):
+    docs = await app.state.developer_avg_response.find({
         "owner": owner,
         "name": name,
-        "developer": {"$in": developers}
-    }, {"_id":0, "owner":0, "name":0, "update_time":0}))
+        "developer": {"$in": list(developers)}
+    }, {"_id":0, "owner":0, "name":0, "update_time":0}).to_list(None)
 
     found_devs = {d['developer']: d for d in docs}
 
@@ -133,6 +390,13 @@ async def get_developer_stats(data: dict):
         else:
             # Remove the avg_response_time field (if any)
             found_devs[dev].pop("avg_response_time", None)
+    return found_devs
 
-    result = [found_devs[dev] for dev in developers]
-    return result
+@app.get("/cache_stats")
+async def cache_stats():
+    return {
+        "get_issue_resolvers": {**resolver_cache.stats(), **resolver_flights.stats()},
+        "get_developer_stats": {**developer_stats_cache.stats(), **developer_stats_flights.stats()},
+        "online_scoring": online_scoring_stats,
+        "version_poll_seconds": CACHE_VERSION_POLL
+    }
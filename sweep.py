@@ -0,0 +1,150 @@
+'''
+Parallel hyperparameter sweep over one registered model.
+
+The processed graph is loaded once, moved to shared memory and handed to
+--workers trial processes, each limited to --threads intra-op threads. The
+workers are not daemonic, so trials may start processes of their own, e.g.
+the walk corpus pool (walk_corpus=1) or DDP (num_procs>1).
+Example:
+
+    python sweep.py --model hgraphsage --grid hidden_channels=64,128 learningRate=0.01,0.001
+'''
+import os
+import csv
+import queue
+import copy
+import argparse
+import itertools
+from time import strftime, localtime, time
+import torch
+import torch.multiprocessing as mp
+from model.registry import ModelRegistry
+from config.config import ModelConf
+from dataset.issueassigndataset import dataset_to_graph
+
+# Shared graph of the trial processes, set once when a worker starts
+_trial_graph = {}
+
+def parse_grid(items, conf):
+    '''
+    Turn "key=v1,v2" items into a list of {key: value} trials
+    '''
+    axes = []
+    for item in items:
+        if '=' not in item:
+            raise ValueError(f'Grid item {item} must look like key=v1,v2')
+        key, values = item.split('=', 1)
+        axes.append([(key.strip(), conf.parse_single_value(v.strip())) for v in values.split(',')])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+def trial_config(base_conf, params, index, output_dir):
+    conf = copy.deepcopy(base_conf)
+    hyperparameter = conf.config['hyperparameter']
+    for key, value in params.items():
+        # Keys found in the hyperparameter list override it there, anything else is a top-level key
+        if isinstance(hyperparameter, dict) and key in hyperparameter:
+            hyperparameter[key] = value
+        else:
+            conf.config[key] = value
+    conf.config['run_name'] = f"{conf['model_name']}_trial{index:03d}"
+    conf.config['checkpoint_dir'] = os.path.join(output_dir, 'checkpoint', f'trial{index:03d}')
+    return conf
+
+def init_trial(graph, hetero, threads):
+    torch.set_num_threads(threads)
+    _trial_graph.update(graph=graph, hetero=hetero)
+
+def run_trial(task):
+    index, conf, params, seed = task
+    if seed is not None:
+        torch.manual_seed(seed)
+    start = time()
+    model_class = ModelRegistry.get_model(conf['model_name'])
+    trial = model_class(conf)
+    trial.load_data(_trial_graph['hetero'], graph=_trial_graph['graph'])
+    trial.train()
+    metrics = trial.validate() or {}
+    return {'trial': index, **params, **{f'val_{k}': v for k, v in metrics.items()},
+            'wall_time': round(time() - start, 2)}
+
+def trial_worker(graph, hetero, threads, tasks, results):
+    '''
+    Run trials from the task queue until it yields None. A failed trial is
+    reported as a result so the sweep goes on with the others
+    '''
+    init_trial(graph, hetero, threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        try:
+            results.put(run_trial(task))
+        except Exception as e:
+            index, _, params, _ = task
+            results.put({'trial': index, **params, 'error': f'{type(e).__name__}: {e}'})
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', required=True, help='Registered model name')
+    parser.add_argument('--config', default=None, help='Base .conf file, defaults to config/<model>.conf')
+    parser.add_argument('--grid', nargs='+', required=True, help='Grid axes such as hidden_channels=64,128')
+    parser.add_argument('--threads', type=int, default=1, help='Intra-op threads per trial')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel trials, defaults to cores // threads')
+    parser.add_argument('--seed', type=int, default=None, help='Seed every trial so they share the same split')
+    args = parser.parse_args()
+
+    base_conf = ModelConf(args.config or os.path.join('config', args.model + '.conf'))
+    hetero = int(base_conf['graph_type']) == 1
+    trials = parse_grid(args.grid, base_conf)
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    current_time = strftime("%Y-%m-%d-%H-%M-%S", localtime(time()))
+    output_dir = os.path.join(base_conf['output'], f'sweep_{args.model}_{current_time}')
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Loading {base_conf['dataset_name']} once for {len(trials)} trials on {workers} workers...")
+    data, user_mapping, issue_mapping = dataset_to_graph(base_conf['dataset_name'], hetero)
+    data.apply(lambda t: t.share_memory_())
+
+    # Children inherit these before importing torch, so BLAS pools respect the limit too
+    os.environ['OMP_NUM_THREADS'] = str(args.threads)
+    os.environ['MKL_NUM_THREADS'] = str(args.threads)
+    tasks = [(i, trial_config(base_conf, params, i, output_dir), params, args.seed) for i, params in enumerate(trials)]
+    ctx = mp.get_context('spawn')
+    task_queue, result_queue = ctx.Queue(), ctx.Queue()
+    processes = [ctx.Process(target=trial_worker, daemon=False,
+                             args=((data, user_mapping, issue_mapping), hetero, args.threads, task_queue, result_queue))
+                 for _ in range(min(workers, len(tasks)))]
+    for process in processes:
+        process.start()
+    for task in tasks:
+        task_queue.put(task)
+    for _ in processes:
+        task_queue.put(None)
+    results = []
+    while len(results) < len(tasks):
+        try:
+            results.append(result_queue.get(timeout=5))
+        except queue.Empty:
+            # A worker killed outside Python (e.g. out of memory) never reports its trial
+            if not any(process.is_alive() for process in processes):
+                print(f'All workers exited with {len(tasks) - len(results)} trials unreported.')
+                break
+    for process in processes:
+        process.join()
+    results.sort(key=lambda r: r['trial'])
+
+    columns = list(dict.fromkeys(k for r in results for k in r))
+    result_path = os.path.join(output_dir, 'results.csv')
+    with open(result_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+
+    print('  '.join(f'{c:>12}' for c in columns))
+    for r in results:
+        print('  '.join(f'{r.get(c, ""):>12.4f}' if isinstance(r.get(c), float) else f'{str(r.get(c, "")):>12}'
+                        for c in columns))
+    print(f'Results saved to {result_path}')
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,8 @@ class Log():
         log_dir = './log/'
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
+        self.log_dir = log_dir
+        self.log_name = model_name_current_time
 
         # Set the log file
         log_file = os.path.join(log_dir, model_name_current_time + '.log')
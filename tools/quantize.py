@@ -0,0 +1,49 @@
+import torch
+
+QUANTIZATIONS = ('none', 'fp16', 'int8')
+
+class QuantizedEmbeddings():
+    '''
+    Embedding table kept as float32 (none), float16, or int8 with a symmetric
+    per-row scale. Scoring converts one block of rows at a time, so a float32
+    copy of the whole table never exists
+    '''
+    def __init__(self, embs, quantization='none'):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantization '{quantization}' is not supported, use one of {', '.join(QUANTIZATIONS)}.")
+        embs = embs.detach().float().cpu().contiguous()
+        self.quantization = quantization
+        self.scale = None
+        if quantization == 'int8':
+            self.scale = embs.abs().amax(dim=1).clamp(min=1e-12) / 127
+            self.data = torch.round(embs / self.scale.unsqueeze(1)).to(torch.int8)
+        elif quantization == 'fp16':
+            self.data = embs.half()
+        else:
+            self.data = embs
+
+    def size(self, dim=None):
+        return self.data.size() if dim is None else self.data.size(dim)
+
+    @property
+    def nbytes(self):
+        nbytes = self.data.numel() * self.data.element_size()
+        if self.scale is not None:
+            nbytes += self.scale.numel() * self.scale.element_size()
+        return nbytes
+
+    def scores(self, queries, rows=slice(None)):
+        '''
+        Inner products of float32 queries with the selected rows (a slice or an index tensor)
+        '''
+        if self.scale is None:
+            return torch.matmul(queries, self.data[rows].float().T)
+        # The per-row scale factors out of the dot product and is applied to the score columns
+        return torch.matmul(queries, self.data[rows].float().T) * self.scale[rows]
+
+def topk_overlap(indices, reference):
+    '''
+    Mean fraction of each reference top-k row that is also in the matching row of indices
+    '''
+    hits = (indices.unsqueeze(2) == reference.unsqueeze(1)).any(dim=1).sum().item()
+    return hits / reference.numel()
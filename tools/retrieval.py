@@ -0,0 +1,98 @@
+import torch
+from tools.quantize import QuantizedEmbeddings
+
+class MIPSIndex():
+    '''
+    Top-k maximum inner product search over user embeddings on CPU.
+    exact: scans the users block by block and keeps a running top-k,
+           so a [num_issues, num_users] score matrix is never materialized
+    ivf:   clusters the users with inner-product k-means and only scans
+           the nprobe lists whose centroids score highest for each query,
+           or as many more as it takes for the lists to hold k users
+    quantization stores the user table as none (float32), fp16 or int8,
+    IVF centroids are always trained on the float32 embeddings
+    '''
+    def __init__(self, user_embs, mode='exact', block_size=65536, nlist=None, nprobe=8, niter=10, seed=0,
+                 quantization='none'):
+        if mode not in ('exact', 'ivf'):
+            raise ValueError(f"Retrieval mode '{mode}' is not supported, use exact or ivf.")
+        user_embs = user_embs.detach().float().cpu().contiguous()
+        self.user_embs = QuantizedEmbeddings(user_embs, quantization)
+        self.num_users = user_embs.size(0)
+        self.mode = mode
+        self.block_size = int(block_size)
+        if mode == 'ivf':
+            # sqrt(N) lists is the usual starting point for IVF
+            self.nlist = min(int(nlist or max(1, int(self.num_users ** 0.5))), self.num_users)
+            self.nprobe = min(int(nprobe), self.nlist)
+            self.train_ivf(user_embs, int(niter), seed)
+
+    def train_ivf(self, user_embs, niter, seed):
+        generator = torch.Generator().manual_seed(seed)
+        perm = torch.randperm(self.num_users, generator=generator)
+        centroids = user_embs[perm[:self.nlist]].clone()
+        for _ in range(niter):
+            assign = self.assign(user_embs, centroids)
+            sums = torch.zeros_like(centroids).index_add_(0, assign, user_embs)
+            counts = torch.bincount(assign, minlength=self.nlist).unsqueeze(1)
+            # Empty lists keep their previous centroid
+            centroids = torch.where(counts > 0, sums / counts.clamp(min=1), centroids)
+        self.centroids = centroids
+        assign = self.assign(user_embs, centroids)
+        self.list_order = torch.argsort(assign)
+        self.list_offsets = torch.zeros(self.nlist + 1, dtype=torch.long)
+        self.list_offsets[1:] = torch.cumsum(torch.bincount(assign, minlength=self.nlist), dim=0)
+
+    def assign(self, user_embs, centroids):
+        assign = torch.empty(self.num_users, dtype=torch.long)
+        for start in range(0, self.num_users, self.block_size):
+            block = user_embs[start:start + self.block_size]
+            assign[start:start + block.size(0)] = torch.matmul(block, centroids.T).argmax(dim=1)
+        return assign
+
+    def search(self, queries, k):
+        '''
+        Return the top-k inner products [num_queries, k] and the matching user rows
+        '''
+        queries = queries.detach().float().cpu()
+        k = min(int(k), self.num_users)
+        if self.mode == 'ivf':
+            return self.search_ivf(queries, k)
+        return self.search_exact(queries, k)
+
+    def search_exact(self, queries, k):
+        top_scores = torch.full((queries.size(0), k), float('-inf'))
+        top_indices = torch.zeros((queries.size(0), k), dtype=torch.long)
+        for start in range(0, self.num_users, self.block_size):
+            scores = self.user_embs.scores(queries, slice(start, start + self.block_size))
+            block_scores, block_indices = torch.topk(scores, k=min(k, scores.size(1)), dim=1)
+            top_scores, top_indices = merge_topk(top_scores, top_indices,
+                                                 block_scores, block_indices + start, k)
+        return top_scores, top_indices
+
+    def search_ivf(self, queries, k):
+        top_scores = torch.full((queries.size(0), k), float('-inf'))
+        top_indices = torch.zeros((queries.size(0), k), dtype=torch.long)
+        order = torch.argsort(torch.matmul(queries, self.centroids.T), dim=1, descending=True)
+        sizes = (self.list_offsets[1:] - self.list_offsets[:-1])[order]
+        # Small lists could leave top-k slots empty, so keep probing until they hold k users
+        probe_counts = ((torch.cumsum(sizes, dim=1) < k).sum(dim=1) + 1).clamp(min=self.nprobe)
+        probes = order[:, :int(probe_counts.max())]
+        probed = torch.arange(probes.size(1)) < probe_counts.unsqueeze(1)
+        # Group the queries by list so every list is scanned with a single matmul
+        for lst in torch.unique(probes[probed]).tolist():
+            rows = ((probes == lst) & probed).any(dim=1).nonzero().squeeze(1)
+            members = self.list_order[self.list_offsets[lst]:self.list_offsets[lst + 1]]
+            if members.numel() == 0:
+                continue
+            scores = self.user_embs.scores(queries[rows], members)
+            list_scores, list_indices = torch.topk(scores, k=min(k, members.numel()), dim=1)
+            top_scores[rows], top_indices[rows] = merge_topk(top_scores[rows], top_indices[rows],
+                                                             list_scores, members[list_indices], k)
+        return top_scores, top_indices
+
+def merge_topk(scores_a, indices_a, scores_b, indices_b, k):
+    scores = torch.cat([scores_a, scores_b], dim=1)
+    indices = torch.cat([indices_a, indices_b], dim=1)
+    top_scores, pos = torch.topk(scores, k=k, dim=1)
+    return top_scores, torch.gather(indices, 1, pos)